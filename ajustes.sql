@@ -1,7 +1,10 @@
+-- The ratings are stored as double precision, the float4 version is dropped so it is not picked instead
+DROP FUNCTION IF EXISTS mmr (float4, float4);
 
 
-CREATE OR REPLACE FUNCTION mmr (mu float4, sigma float4) returns float4 as $$
+
+CREATE OR REPLACE FUNCTION mmr (mu float8, sigma float8) returns float8 as $$
 BEGIN
 RETURN 20 * (mu - 3  * sigma + 25);
 END
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql IMMUTABLE;
\ No newline at end of file
@@ -4,4 +4,5 @@ class InhouseAppConfig(AppConfig):
     name = 'inhouse'
 
     def ready(self):
-    	pass
\ No newline at end of file
+        # Connects the signals keeping the rating cache up to date
+        from inhouse.common_utils import rating_cache
\ No newline at end of file
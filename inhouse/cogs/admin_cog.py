@@ -4,12 +4,13 @@ import discord
 from discord.ext import commands
 from discord.ext.commands import guild_only
 
-from inhouse import game_queue, matchmaking_logic
 from inhouse import models
+from inhouse import repositories
 from inhouse.common_utils.constants import PREFIX
 from inhouse.common_utils.docstring import doc
 import inhouse.common_utils.game_channels_manager
-from inhouse.common_utils.get_last_game import get_last_game
+from inhouse.matchmaking_logic.recompute_ratings import recompute_ratings
+from inhouse.matchmaking_logic.scoring_service import scoring_service
 from inhouse.robot import InhouseBot
 from inhouse.ranking_channel_handler.ranking_channel_handler import ranking_channel_handler
 
@@ -48,14 +49,14 @@ class AdminCog(commands.Cog, name="Admin"):
 
         if not member_or_channel or type(member_or_channel) == discord.TextChannel:
             channel = ctx.channel if not member_or_channel else member_or_channel
-            game_queue.reset_queue(channel.id)
+            await repositories.queue_players.reset_queue(channel.id)
 
             # TODO Find a way to cancel the ongoing ready-checks as they *will* bug out
             #   The current code organisation does not allow to do it easily, so maybe it’ll need some structure changes
             await ctx.send(f"Filas resetadas em {channel.name}")
 
         elif type(member_or_channel) == discord.Member:
-            game_queue.remove_player(member_or_channel.id)
+            await repositories.queue_players.remove_player(member_or_channel.id)
             await ctx.send(f"{member_or_channel.name} foi removido de todas as filas")
 
         await self.bot.game_channels_manager.update_queue_channels(bot=self.bot, server_id=ctx.guild.id)
@@ -64,12 +65,32 @@ class AdminCog(commands.Cog, name="Admin"):
     async def won(self, ctx: commands.Context, member: discord.Member):
         """
         Scores the user’s last game as a win and recomputes ratings based on it
+
+        If the game was already scored for the other team, the ratings are replayed from it
         """
-        # TODO LOW PRIO Make a function that recomputes *all* ratings to allow to re-score/delete/cancel any game
         if self.not_handles_ranking:
             return
 
-        matchmaking_logic.score_game_from_winning_player(player_id=member.id, server_id=ctx.guild.id)
+        game, participant = await repositories.games.get_last_game(player_id=member.id, server_id=ctx.guild.id)
+
+        if not game:
+            await ctx.send("Jogo não encontrado")
+            return
+
+        if game.winner:
+            if game.winner == participant.side:
+                await ctx.send("O jogo já foi contado como vitória para esse time.")
+                return
+
+            await scoring_service.change_game_winner(game, participant.side)
+
+            # Players of the later games can be in queue with the ratings the replay changed
+            await self.bot.game_channels_manager.reload_ratings(reload_cache=False)
+
+        elif not await scoring_service.score_game(game, participant.side):
+            await ctx.send("O jogo já foi contado como vitória.")
+            return
+
         await ranking_channel_handler.update_ranking_channels(self.bot, ctx.guild.id)
 
         await ctx.send(
@@ -77,26 +98,62 @@ class AdminCog(commands.Cog, name="Admin"):
             f"e as estatísticas foram atualizadas"
         )
 
+    @admin.command()
+    @guild_only()
+    async def recompute(self, ctx: commands.Context):
+        """
+        Recomputes all ratings of the server by replaying its scored games
+
+        Used after a game was scored for the wrong team or deleted
+        """
+        if self.not_handles_ranking:
+            return
+
+        # The replay runs on the database threads so the bot keeps answering during it
+        result = await repositories.database_sync_to_async(recompute_ratings)(server_id=ctx.guild.id)
+        await self.bot.game_channels_manager.reload_ratings()
+        await ranking_channel_handler.update_ranking_channels(self.bot, ctx.guild.id)
+
+        await ctx.send(
+            f"{result.games} jogos reprocessados em {result.duration:.2f}s, "
+            f"{result.ratings_updated} ratings foram atualizados"
+        )
+
+    @admin.command()
+    @guild_only()
+    async def reload_ratings(self, ctx: commands.Context):
+        """
+        Reloads the ratings used by the matchmaking from the database
+
+        Used after the ratings were changed outside of the bot, for example by the recompute_ratings command
+        """
+        await self.bot.game_channels_manager.reload_ratings()
+        await ranking_channel_handler.update_ranking_channels(self.bot, ctx.guild.id)
+
+        await ctx.send("Os ratings foram recarregados")
+
     @admin.command()
     async def cancel(self, ctx: commands.Context, member: discord.Member):
         """
-        Cancels the user’s ongoing game
+        Cancels the user’s last game
 
-        Only works if the game has not been scored yet
+        If the game was already scored, the ratings of its players are replayed without it
         """
         if self.not_handles_queue:
             return
 
-        game, participant = get_last_game(player_id=member.id, server_id=ctx.guild.id)
+        game, participant = await repositories.games.get_last_game(player_id=member.id, server_id=ctx.guild.id)
 
         if not game:
             await ctx.send("Jogo não encontrado")
-
-        if game.winner:
-            await ctx.send("O jogo já foi contado como vitória.")
             return
 
-        game.delete()
+        scored = bool(game.winner)
+        await scoring_service.cancel_game(game)
+
+        if scored:
+            await self.bot.game_channels_manager.reload_ratings(reload_cache=False)
+            await ranking_channel_handler.update_ranking_channels(self.bot, ctx.guild.id)
 
         await ctx.send(f" O jogo do {member.display_name} foi cancelado e excluido do banco de dados.")
         await self.bot.game_channels_manager.update_queue_channels(bot=self.bot, server_id=ctx.guild.id)
@@ -111,7 +168,7 @@ class AdminCog(commands.Cog, name="Admin"):
             if self.not_handles_queue:
                 await ctx.send(f"Os valor aceitos para o comando {PREFIX}admin mark é RANKING.")
                 return
-            self.bot.game_channels_manager.mark_queue_channel(ctx.channel.id, ctx.guild.id)
+            await self.bot.game_channels_manager.mark_queue_channel(ctx.channel.id, ctx.guild.id)
 
             await ctx.send(f"Canal atual marcado com fila")
 
@@ -119,7 +176,7 @@ class AdminCog(commands.Cog, name="Admin"):
             if self.not_handles_ranking:
                 await ctx.send(f"Os valor aceitos para o comando {PREFIX}admin mark é QUEUE.")
                 return
-            ranking_channel_handler.mark_ranking_channel(channel_id=ctx.channel.id, server_id=ctx.guild.id)
+            await ranking_channel_handler.mark_ranking_channel(channel_id=ctx.channel.id, server_id=ctx.guild.id)
             await ctx.send(f"Canal atual marcado como ranques")
 
         else:
@@ -131,7 +188,7 @@ class AdminCog(commands.Cog, name="Admin"):
         """
         Reverts the current channel to "normal"
         """
-        self.bot.game_channels_manager.unmark_queue_channel(ctx.channel.id, ctx.guild.id)
-        ranking_channel_handler.unmark_ranking_channel(ctx.channel.id)
+        await self.bot.game_channels_manager.unmark_queue_channel(ctx.channel.id)
+        await ranking_channel_handler.unmark_ranking_channel(ctx.channel.id)
 
         await ctx.send(f"O canal atual foi revertido para um canal normal.")
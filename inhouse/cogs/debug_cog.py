@@ -3,15 +3,16 @@ from typing import Union
 import discord
 from discord.ext import commands
 from discord.ext.commands import guild_only
+from tabulate import tabulate
 
-from inhouse import game_queue, matchmaking_logic
+from inhouse import matchmaking_logic
 from inhouse import models
+from inhouse import repositories
 from inhouse.common_utils.constants import PREFIX
 from inhouse.common_utils.docstring import doc
 import inhouse.common_utils.game_channels_manager
-from inhouse.common_utils.get_last_game import get_last_game
+from inhouse.matchmaking_logic.telemetry import SearchStats, matchmaking_metrics
 from inhouse.robot import InhouseBot
-from inhouse.models import Game
 from inhouse.ranking_channel_handler.ranking_channel_handler import ranking_channel_handler
 
 
@@ -39,15 +40,53 @@ class DebugCog(commands.Cog, name="Debug"):
     async def channel(
         self, ctx: commands.Context, command: str, game_id: int
     ):
-        game =  Game.objects.filter(id=game_id)
+        game = await repositories.games.get(game_id)
         if game and command == 'create':
-            await self.bot.game_channels_manager.create_game_channel(ctx, game[0])
+            await self.bot.game_channels_manager.create_game_channel(ctx, game)
             return
         if game and command == 'delete':
-            await self.bot.game_channels_manager.delete_game_channel(ctx, game[0])
+            await self.bot.game_channels_manager.delete_game_channel(ctx, game)
             return
     
         await ctx.send(
             f"a sintaxe do comando é:\n"
             f"{PREFIX}debug channel (create|delete) ID_DO_JOGO"
-        )
\ No newline at end of file
+        )
+
+    @debug.command()
+    async def matchmaking(self, ctx: commands.Context):
+        """
+        Shows the counters of the last matchmaking tick of every channel and the totals since the bot started
+        """
+        if not matchmaking_metrics.ticks:
+            await ctx.send("Nenhum matchmaking foi executado ainda")
+            return
+
+        def row(name: str, stats: SearchStats):
+            return [
+                name,
+                stats.compositions_generated,
+                stats.duo_rejections,
+                stats.duplicate_rejections,
+                stats.pruned,
+                stats.compositions_scored,
+                f"{stats.best_score:.4f}" if stats.best_score is not None else "-",
+                "sim" if stats.threshold_reached else "não",
+                "sim" if stats.exhaustive else "não",
+                " ".join(f"{phase}={duration * 1000:.0f}ms" for phase, duration in stats.phases.items()),
+            ]
+
+        rows = [
+            row(getattr(self.bot.get_channel(channel_id), "name", str(channel_id)), stats)
+            for channel_id, stats in matchmaking_metrics.last_ticks.items()
+        ]
+        rows.append(row(f"total ({matchmaking_metrics.ticks} ticks)", matchmaking_metrics.totals))
+
+        table = tabulate(
+            rows,
+            headers=[
+                "canal", "geradas", "duo", "duplicadas", "podadas", "avaliadas", "score", "limiar", "exaustivo", "fases"
+            ],
+        )
+
+        await ctx.send(f"```{table}```")
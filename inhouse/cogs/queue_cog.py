@@ -3,15 +3,15 @@ from datetime import datetime, timedelta
 import discord
 from discord.ext import commands
 
-from inhouse import game_queue
-from inhouse import matchmaking_logic
+from inhouse import repositories
+from inhouse.matchmaking_logic import find_best_game_async
 
 from inhouse.common_utils.constants import PREFIX
 from inhouse.common_utils.docstring import doc
 from inhouse.common_utils.emoji_and_thumbnails import get_role_emoji
 from inhouse.common_utils.fields import RoleConverter
-from inhouse.common_utils.get_last_game import get_last_game
 from inhouse.common_utils.validation_dialog import checkmark_validation
+from inhouse.matchmaking_logic.scoring_service import scoring_service
 
 from inhouse.exceptions import QueueChannelsOnly
 from inhouse.common_utils.game_channels_manager import queue_channel_only
@@ -45,9 +45,9 @@ class QueueCog(commands.Cog, name="Queue"):
 
         Should only be called inside guilds
         """
-        queue = game_queue.GameQueue(ctx.channel.id)
+        queue = await repositories.queue_players.load_queue(ctx.channel.id)
 
-        game = matchmaking_logic.find_best_game(queue)
+        game = await find_best_game_async(queue)
 
         if not game:
             return
@@ -59,7 +59,7 @@ class QueueCog(commands.Cog, name="Queue"):
             ready_check_message = await ctx.send(content=game.players_ping, embed=embed, delete_after=60 * 15)
 
             # We mark the ready check as ongoing (which will be used to the queue)
-            game_queue.start_ready_check(
+            await repositories.queue_players.start_ready_check(
                 player_ids=game.player_ids_list,
                 channel_id=ctx.channel.id,
                 ready_check_message_id=ready_check_message.id,
@@ -81,7 +81,7 @@ class QueueCog(commands.Cog, name="Queue"):
             # We catch every error here to make sure it does not become blocking
             except Exception as e:
                 self.bot.logger.error(e)
-                game_queue.cancel_ready_check(
+                await repositories.queue_players.cancel_ready_check(
                     ready_check_id=ready_check_message.id,
                     ids_to_drop=game.player_ids_list,
                     server_id=ctx.guild.id,
@@ -97,10 +97,10 @@ class QueueCog(commands.Cog, name="Queue"):
 
             if ready is True:
                 # We drop all 10 players from the queue
-                game_queue.validate_ready_check(ready_check_message.id)
+                await repositories.queue_players.validate_ready_check(ready_check_message.id)
 
                 # We commit the game to the database (without a winner)
-                game.save()
+                await repositories.games.save(game)
 
                 self.bot.game_channels_manager.mark_queue_related_message(
                     await ctx.send(embed=game.get_embed("GAME_ACCEPTED"),)
@@ -108,7 +108,7 @@ class QueueCog(commands.Cog, name="Queue"):
 
             elif ready is False:
                 # We remove the player who cancelled
-                game_queue.cancel_ready_check(
+                await repositories.queue_players.cancel_ready_check(
                     ready_check_id=ready_check_message.id,
                     ids_to_drop=players_to_drop,
                     channel_id=ctx.channel.id,
@@ -126,7 +126,7 @@ class QueueCog(commands.Cog, name="Queue"):
 
             elif ready is None:
                 # We remove the timed out players from *all* channels (hence giving server id)
-                game_queue.cancel_ready_check(
+                await repositories.queue_players.cancel_ready_check(
                     ready_check_id=ready_check_message.id,
                     ids_to_drop=players_to_drop,
                     server_id=ctx.guild.id,
@@ -188,7 +188,7 @@ class QueueCog(commands.Cog, name="Queue"):
         if not duo:
 
             # Simply queuing the player
-            game_queue.add_player(
+            await repositories.queue_players.add_player(
                 player_id=ctx.author.id,
                 name=ctx.author.display_name,
                 role=role,
@@ -221,7 +221,7 @@ class QueueCog(commands.Cog, name="Queue"):
                 return
 
             # Here, we have a working duo queue
-            game_queue.add_duo(
+            await repositories.queue_players.add_duo(
                 first_player_id=ctx.author.id,
                 first_player_role=role,
                 first_player_name=ctx.author.display_name,
@@ -249,7 +249,7 @@ class QueueCog(commands.Cog, name="Queue"):
     ):
         if self.not_handles_queue:
             return
-        game_queue.remove_player(player_id=ctx.author.id, channel_id=ctx.channel.id)
+        await repositories.queue_players.remove_player(player_id=ctx.author.id, channel_id=ctx.channel.id)
 
         await self.bot.game_channels_manager.update_queue_channels(bot=self.bot, server_id=ctx.guild.id)
 
@@ -267,7 +267,7 @@ class QueueCog(commands.Cog, name="Queue"):
         self, ctx: commands.Context,
     ):
         # Get the latest game
-        game, participant = get_last_game(
+        game, participant = await repositories.games.get_last_game(
             player_id=ctx.author.id, server_id=ctx.guild.id
         )
 
@@ -309,7 +309,11 @@ class QueueCog(commands.Cog, name="Queue"):
             await ctx.send("Score input was either cancelled or timed out")
             return
 
-        matchmaking_logic.score_game_from_winning_player(player_id=ctx.author.id, server_id=ctx.guild.id)
+        # The ratings are written on the scoring threads so other channels keep being served meanwhile
+        if not await scoring_service.score_game(game, participant.side):
+            await ctx.send(f"Game {game.id} has already been scored")
+            return
+
         await ranking_channel_handler.update_ranking_channels(self.bot, ctx.guild.id)
         
         # If we get there, the score was validated and we can simply update the game and the ratings
@@ -336,7 +340,7 @@ class QueueCog(commands.Cog, name="Queue"):
         if self.not_handles_queue:
             return
         # Get the latest game
-        game, participant = get_last_game(
+        game, participant = await repositories.games.get_last_game(
             player_id=ctx.author.id, server_id=ctx.guild.id)
 
         if game and game.winner:
@@ -370,10 +374,10 @@ class QueueCog(commands.Cog, name="Queue"):
 
         else:
 
-            for participant in game.participants.values():
+            for participant in game.participants.all():
                 self.players_whose_last_game_got_cancelled[participant.player_id] = datetime.now()
 
-            game.delete()
+            await repositories.games.delete(game)
 
             self.bot.game_channels_manager.mark_queue_related_message(
                 await ctx.send(f"Game {game.id} was cancelled")
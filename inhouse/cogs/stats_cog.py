@@ -1,13 +1,10 @@
 import tempfile
 from collections import defaultdict
-from datetime import datetime, timedelta
-from asgiref.sync import sync_to_async
+from datetime import datetime
 import dateparser
 import discord
 import lol_id_tools
 import mplcyberpunk
-from django.db.models import Sum, Func, F
-
 from discord import Embed
 from discord.ext import commands, menus
 from discord.ext.commands import guild_only
@@ -17,9 +14,8 @@ import matplotlib.pyplot as plt
 from inhouse.common_utils.constants import PREFIX
 from inhouse.common_utils.docstring import doc
 from inhouse.common_utils.emoji_and_thumbnails import get_role_emoji, get_rank_emoji
-from inhouse.models import GameParticipant, Game, PlayerRating, Player
+from inhouse import repositories
 from inhouse.common_utils.fields import ChampionNameConverter, RoleConverter
-from inhouse.common_utils.get_last_game import get_last_game
 
 from inhouse.robot import InhouseBot
 from inhouse.ranking_channel_handler.ranking_channel_handler import ranking_channel_handler
@@ -61,23 +57,16 @@ class StatsCog(commands.Cog, name="Stats"):
         if self.not_handles_ranking:
             return
 
+        # We write down the champion
+        game_id = await repositories.game_participants.set_champion(
+            player_id=ctx.author.id, server_id=ctx.guild.id, champion_id=champion_name, game_id=game_id
+        )
+
         if not game_id:
-            game, participant = get_last_game(player_id=ctx.author.id, server_id=ctx.guild.id)
-        else:
-            participant = GameParticipant.objects.filter(game__id=game_id, player_id=ctx.author.id)
-            if not participant:
-                await ctx.send(
-                    f"Partida não encontrada"
-                )
-                return
-            
-            participant = participant[0]
-            game = participant.game
-
-            # We write down the champion
-            participant.champion_id = champion_name
-            participant.save()
-            game_id = game.id
+            await ctx.send(
+                f"Partida não encontrada"
+            )
+            return
 
         await ctx.send(
             f"Champion for game {game_id} was set to "
@@ -96,21 +85,17 @@ class StatsCog(commands.Cog, name="Stats"):
         if self.not_handles_ranking:
             return
         # TODO LOW PRIO Add an @ user for admins
-        game_participant_query = GameParticipant.objects.filter(player_id=ctx.author.id).order_by('game__start')
-
         # If we’re on a server, we only show games played on that server
-        if ctx.guild:
-            game_participant_query = game_participant_query.filter(game__server_id=ctx.guild.id)
-
+        game_participant_list = await repositories.game_participants.get_history(
+            player_id=ctx.author.id, server_id=ctx.guild.id if ctx.guild else None
+        )
 
-        if not game_participant_query:
+        if not game_participant_list:
             await ctx.send(
                 f"Nenhuma partida encontrada"
             )
             return
 
-        game_participant_list = [(g.game.all()[0], g) for g in game_participant_query[:20]]
-
         pages = menus.MenuPages(
             source=HistoryPagesSource(
                 game_participant_list,
@@ -133,35 +118,22 @@ class StatsCog(commands.Cog, name="Stats"):
         if self.not_handles_ranking:
             return
 
-        rating_objects = PlayerRating.objects.filter(player_id=ctx.author.id)
-
-        if ctx.guild:
-            rating_objects = rating_objects.filter(player__server_id=ctx.guild.id)
+        player_stats = await repositories.player_ratings.get_player_stats(
+            player_id=ctx.author.id, server_id=ctx.guild.id if ctx.guild else None
+        )
 
         rows = []
 
-        for role in roles_list:
-            # TODO LOW PRIO Make that a subquery
-            row = rating_objects.filter(
-                role=role
-            )
-            if not row:
-                continue
-
-            row = row[0]
-
-            rank = PlayerRating.objects.annotate(mmr=Func(F('trueskill_mu'),F('trueskill_sigma'), function='mmr'))
-            rank = rank.filter(mmr__gt=row.mmr).exclude(player_id=ctx.author.id).count()
-
+        for row, rank in player_stats:
             rank_str = get_rank_emoji(rank)
-            wins = row.wins.count()
+            wins = row.win_count
 
             row_string = (
-                f"{f'{self.bot.get_guild(row.player_server_id).name} ' if not ctx.guild else ''}"
+                f"{f'{self.bot.get_guild(row.player.server_id).name} ' if not ctx.guild else ''}"
                 f"{get_role_emoji(row.role)} "
                 f"{rank_str} "
                 f"`{int(row.mmr)} MMR  "
-                f"{wins}W {row.count-wins}L`"
+                f"{wins}W {row.game_count-wins}L`"
             )
 
             rows.append(row_string)
@@ -185,7 +157,7 @@ class StatsCog(commands.Cog, name="Stats"):
         if self.not_handles_ranking:
             return
 
-        ratings = ranking_channel_handler.get_server_ratings(ctx.guild.id, role=role)
+        ratings = await repositories.player_ratings.get_server_ranking(ctx.guild.id, role=role)
 
         if not ratings:
             await ctx.send("No games played yet")
@@ -201,25 +173,35 @@ class StatsCog(commands.Cog, name="Stats"):
         await pages.start(ctx)
 
     @commands.command(aliases=["rating_history", "ratings_history"])
-    async def mmr_history(self, ctx: commands.Context):
+    @doc(f"""
+        Displays a graph of your MMR history over the last days, 30 by default
+
+        Use 0 to display your whole history
+
+        Example:
+            {PREFIX}mmr_history
+            {PREFIX}mmr_history 365
+            {PREFIX}mmr_history 0
+    """)
+    async def mmr_history(self, ctx: commands.Context, days: int = 30):
         if self.not_handles_ranking:
             return
-        """
-        Displays a graph of your MMR history over the past month
-        """
-        date_start = datetime.now() - timedelta(hours=24 * 30)
-        participants = GameParticipant.objects.filter(player_id=ctx.author.id,game__start__gt=date_start)
-        participants = participants.order_by('game__start')
+
+        if days < 0:
+            await ctx.send("O número de dias não pode ser negativo, use 0 para ver todo o histórico")
+            return
+
+        participants = await repositories.game_participants.get_rating_history(player_id=ctx.author.id, days=days)
 
         mmr_history = defaultdict(lambda: {"dates": [], "mmr": []})
 
         latest_role_mmr = {}
 
         for row in participants:
-            mmr_history[row.role]["dates"].append(row.game.all()[0].start)
-            mmr_history[row.role]["mmr"].append(row.mmr)
+            mmr_history[row.role]["dates"].append(row.game_start)
+            mmr_history[row.role]["mmr"].append(row.post_mmr)
 
-            latest_role_mmr[row.role] = row.mmr
+            latest_role_mmr[row.role] = row.post_mmr
 
         legend = []
         for role in mmr_history:
@@ -231,7 +213,8 @@ class StatsCog(commands.Cog, name="Stats"):
             legend.append(role)
 
         plt.legend(legend)
-        plt.title(f"Variação de MMR no ultimo mês - {ctx.author.display_name}")
+        period = f"nos últimos {days} dias" if days else "desde o primeiro jogo"
+        plt.title(f"Variação de MMR {period} - {ctx.author.display_name}")
         mplcyberpunk.add_glow_effects()
 
         # This looks to be unnecessary verbose with all the closing by hand, I should take a look
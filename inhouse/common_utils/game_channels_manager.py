@@ -7,12 +7,13 @@ from discord.ext import tasks
 from discord.ext import commands
 
 from inhouse import game_queue
+from inhouse import repositories
 from inhouse.exceptions import *
 from inhouse.models import ChannelInformation, QueuePlayer
 from inhouse.common_utils.embeds import embeds_color
 from inhouse.common_utils.emoji_and_thumbnails import get_role_emoji
 from inhouse.common_utils.constants import PREFIX
-from inhouse.queue_channel.matchmaker import MatchMaker
+from inhouse.queue_channel.scheduler import MatchmakingScheduler
 from django.dispatch import receiver
 from django.core.cache import cache
 from django.db.models.signals import post_save, pre_delete
@@ -24,11 +25,13 @@ class GameChannelManager:
         logging.info(f'starting GameChannelManager instance')
         self.bot = bot
 
+        # {channel_id} = GameQueue, updated incrementally when players join and leave
         self.queue_channels = {}
         self._queue_cache = {}
         self.latest_queue_message_ids = {}
 
-        self.match_makers = {}
+        # A single scheduler runs the matchmaking of every queue channel
+        self.matchmaking_scheduler = MatchmakingScheduler(bot)
 
         self.restart = True
         post_save.connect(self.add_queue, sender=QueuePlayer)
@@ -41,6 +44,7 @@ class GameChannelManager:
         logging.info(f'Iniciando as tasks do GameChannelManager')
         self.refresh_channel_queue.start()
         self.clear_unwanted_messages.start()
+        self.matchmaking_scheduler.start()
 
     async def create_game_channel(self, ctx, game):
         #if game.winner:
@@ -55,11 +59,7 @@ class GameChannelManager:
         game.channel_text = text_channel.id
         game.channel_blue = blue_channel.id
         game.channel_red = red_channel.id
-        game.save()
-
-        teams = game.teams.BLUE
-
-        #for t in teams.BLUE:
+        await repositories.games.save(game)
 
 
     async def delete_game_channel(self, ctx, game):
@@ -72,37 +72,77 @@ class GameChannelManager:
         await guild.get_channel(game.channel_blue).delete()
         await guild.get_channel(game.channel_red).delete()
 
-        participants = game.participants.all()
+    async def reload_ratings(self, reload_cache: bool = True):
+        """
+        Reloads the rating cache and the ratings of every queue, after the ratings were rewritten by a recompute
+
+        Replays from a game set the ratings they change in the cache, so they only reload the queues
+        """
+        if reload_cache:
+            await repositories.player_ratings.load_cache()
+
+        for queue in list(self.queue_channels.values()):
+            ratings = await repositories.queue_players.load_ratings(set(queue.ratings))
+
+            # Players who left the queue during the query are not added back
+            queue.ratings.update({key: rating for key, rating in ratings.items() if key in queue.ratings})
+
+        logging.info(f'Ratings das filas recarregados')
 
     def get_server_queues(self, channel_id):
-        return [v for k,v in self.queue_channels[channel_id].items()]
+        return self.queue_channels[channel_id].queue_players
 
     def add_matchmaker(self,channel_id):
-        logging.info(f'Criando instancia do MatchMaker para o canal {channel_id}')
-        self.match_makers[channel_id] = MatchMaker(channel_id, self)
-        self.match_makers[channel_id].start()
+        # Adding a channel twice does nothing, so a restart cannot duplicate its matchmaking
+        self.matchmaking_scheduler.add_channel(channel_id, self)
 
     def remove_matchmaker(self,channel_id):
-        logging.info(f'Remove instancia do MatchMaker para o canal {channel_id}')
-        self.match_makers[channel_id].stop()
-        self.match_makers.pop(channel_id, None)
+        self.matchmaking_scheduler.remove_channel(channel_id)
+
+    def trigger_matchmaking(self, channel_id):
+        """
+        Matchmaking only runs when the queue of a channel changes
+        """
+        self.matchmaking_scheduler.trigger(channel_id)
+
+    # Models are saved and deleted on the database threads, so the signals below are received there
+    #   What the queues need from the database is loaded in the signal, and the queues and the matchmaking are
+    #   then only changed from the event loop, which never queries
 
     def add_queue(self, sender, instance, using,**kwargs):
-        logging.warning('add_queue')
-        self.queue_channels[instance.channel_id][instance.id] = instance
+        logging.debug('add_queue')
+        instance.player
+        ratings = game_queue.GameQueue.load_ratings({(instance.player_id, instance.role)})
+
+        self.bot.loop.call_soon_threadsafe(self._add_queue_player, instance, ratings)
+
+    def _add_queue_player(self, queue_player, ratings):
+        if queue_player.channel_id in self.queue_channels:
+            self.queue_channels[queue_player.channel_id].add(queue_player, ratings)
+            self.trigger_matchmaking(queue_player.channel_id)
 
     def remove_queue(self, sender, instance, using,**kwargs):
-        if self.queue_channels.get(instance.channel_id):
-            self.queue_channels[instance.channel_id].pop(instance.id, None)
+        self.bot.loop.call_soon_threadsafe(self._remove_queue_player, instance)
+
+    def _remove_queue_player(self, queue_player):
+        if queue_player.channel_id in self.queue_channels:
+            self.queue_channels[queue_player.channel_id].remove(queue_player)
+            self.trigger_matchmaking(queue_player.channel_id)
 
     def add_channel(self, sender, instance, using,**kwargs):
-        logging.warning('add_queue')
-        self.add_matchmaker(instance.id)
-        self.queue_channels[instance.id] = {q.id:q for q in instance.queues.all()}
+        if instance.channel_type == 'QUEUE':
+            self.bot.loop.call_soon_threadsafe(self._add_queue_channel, instance.id, game_queue.GameQueue(instance.id))
+
+    def _add_queue_channel(self, channel_id, queue):
+        self.queue_channels[channel_id] = queue
+        self.add_matchmaker(channel_id)
 
     def remove_channel(self, sender, instance, using,**kwargs):
-        self.remove_matchmaker(instance.id)
-        self.queue_channels.pop(instance.id, None)
+        self.bot.loop.call_soon_threadsafe(self._remove_queue_channel, instance.id)
+
+    def _remove_queue_channel(self, channel_id):
+        self.remove_matchmaker(channel_id)
+        self.queue_channels.pop(channel_id, None)
 
     @tasks.loop(seconds=1, minutes=0, hours=0, count=None, reconnect=True)
     async def clear_unwanted_messages(self):
@@ -132,15 +172,15 @@ class GameChannelManager:
 
         guild = guild[0]
         if self.restart:
-            channels = ChannelInformation.objects.filter(channel_type='QUEUE')
-            for c in channels:
+            for c in await repositories.channels.get_channels('QUEUE'):
+                # The queue is set before the channel is scheduled, as its search reads it
+                self.queue_channels[c.id] = await repositories.queue_players.load_queue(c.id)
                 self.add_matchmaker(c.id)
-                self.queue_channels[c.id] = {q.id: q for q in c.queues.filter(ready_check_id__isnull=True).order_by('queue_time')}
 
         added_duo = []
         for channel_id in self.queue_channels:
             
-            queue = game_queue.GameQueue(channel_id, [v for k,v in self.queue_channels[channel_id].items()])
+            queue = self.queue_channels[channel_id]
 
             channel = guild.get_channel(channel_id)
 
@@ -149,12 +189,12 @@ class GameChannelManager:
                 continue
             # If the new queue is the same as the cache, we simple return
             if queue == self._queue_cache.get(channel_id):
-                return
+                continue
             else:
                 await channel.purge()
 
             # Else, we update our cache (useful to not send too many messages)
-            self._queue_cache[channel.id] = queue
+            self._queue_cache[channel.id] = queue.copy()
 
             # Create the queue embed
             embed = Embed(colour=embeds_color, url='https://inhouse.local')
@@ -204,44 +244,36 @@ class GameChannelManager:
         self.restart = False
 
 
-    def mark_queue_channel(self, channel_id, server_id):
+    async def mark_queue_channel(self, channel_id, server_id):
         """
         Marks the given channel + server combo as a queue
         """
-        channel = ChannelInformation(id=channel_id, server_id=server_id, channel_type="QUEUE")
-        channel.save()
+        await repositories.channels.mark(channel_id, server_id, "QUEUE")
 
         logging.info(f"O canal {channel_id} foi marcado com uma fila")
 
 
-    def unmark_queue_channel(self, channel_id, server_id):
-        game_queue.reset_queue(channel_id)
+    async def unmark_queue_channel(self, channel_id):
+        await repositories.queue_players.reset_queue(channel_id)
 
-        channel = ChannelInformation.objects.filter(id=channel_id, server_id=server_id, channel_type="QUEUE")
-        if channel:
-            channel.delete()
+        if await repositories.channels.unmark(channel_id, "QUEUE"):
             logging.info(f"o canal {channel_id} foi marcado com uma canal comum.")
-        logging.info(f"o canal {channel_id} não é uma fila.")
+        else:
+            logging.info(f"o canal {channel_id} não é uma fila.")
 
 
-    def update_queue_channels(self, bot, server_id):
+    async def update_queue_channels(self, bot, server_id):
         """
         Updates the queues in the given server
 
         If the server is not specified (restart), updates queue in all tagged queue channels
+        The queue messages themselves are refreshed by refresh_channel_queue
         """
-        if not server_id:
-            restart = True
-            channels_to_check = [k for k  in self.queue_channels.keys()]
-        else:
-            restart = False
-            channels_to_check = self.get_server_queues(server_id)
-
-        for channel_id in channels_to_check:
+        for channel_id in list(self.queue_channels):
             channel = bot.get_channel(channel_id)
 
             if not channel:  # Happens when the channel does not exist anymore
-                self.unmark_queue_channel(channel_id)  # We remove it for the future
+                await self.unmark_queue_channel(channel_id)  # We remove it for the future
                 continue
 
 
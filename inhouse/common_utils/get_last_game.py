@@ -1,13 +1,27 @@
 from typing import Tuple, Optional
 
+from django.db.models import prefetch_related_objects
+
 from inhouse.models import Game, GameParticipant
 
 
-def get_last_game(
-    player_id: int, server_id: int):
-    games = Game.objects.filter(participants__player_id=player_id, server_id=server_id).order_by('-id')
-    if games:
-    	game = games[0]
-    	participant = game.participants.filter(player_id=player_id)[0]
-    	return games[0], participant
-    return None, None
+def get_last_game(player_id: int, server_id: int) -> Tuple[Optional[Game], Optional[GameParticipant]]:
+    """
+    Returns the last game of the player on the server and his participant in it
+
+    The participants of the game are prefetched, so its embeds and player lists do not query them again
+    """
+    participant = (
+        GameParticipant.objects.filter(player_id=player_id, game__server_id=server_id)
+        .select_related('game')
+        .order_by('-game_id')
+        .first()
+    )
+
+    if not participant:
+        return None, None
+
+    game = participant.game
+    prefetch_related_objects([game], 'participants')
+
+    return game, participant
@@ -0,0 +1,85 @@
+import logging
+import threading
+from typing import Dict, Iterable, Tuple
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inhouse.models import PlayerRating
+
+# {(player_id, role)} = (mu, sigma)
+Ratings = Dict[Tuple[int, str], Tuple[float, float]]
+
+
+class RatingCache:
+    """
+    In-process snapshot of the PlayerRating rows as floats, so the matchmaking does not query ratings
+
+    It is loaded in bulk once, updated by update_trueskill and invalidated when a PlayerRating is saved elsewhere.
+    Ratings missing from the cache are loaded in a single query the first time they are requested.
+    It only feeds the matchmaking search: games are snapshotted from the PlayerRating rows in Game.from_players,
+    as ratings written by another process do not invalidate it.
+    """
+
+    def __init__(self):
+        self._ratings: Ratings = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads every rating in a single query, called when the bot starts
+        """
+        ratings = {
+            (player_id, role): (mu, sigma)
+            for player_id, role, mu, sigma in PlayerRating.objects.values_list(
+                "player_id", "role", "trueskill_mu", "trueskill_sigma"
+            )
+        }
+
+        with self._lock:
+            self._ratings = ratings
+            self._loaded = True
+
+        logging.info(f"{len(ratings)} ratings carregados no cache")
+
+    def get_many(self, keys: Iterable[Tuple[int, str]]) -> Ratings:
+        """
+        Returns the {(player_id, role)} = (mu, sigma) ratings of the keys, keys without a PlayerRating being absent
+        """
+        if not self._loaded:
+            self.load()
+
+        keys = set(keys)
+
+        with self._lock:
+            missing = keys.difference(self._ratings)
+
+        if missing:
+            rows = PlayerRating.objects.filter(player_id__in={player_id for player_id, role in missing}).values_list(
+                "player_id", "role", "trueskill_mu", "trueskill_sigma"
+            )
+
+            with self._lock:
+                for player_id, role, mu, sigma in rows:
+                    self._ratings[player_id, role] = (mu, sigma)
+
+        with self._lock:
+            return {key: self._ratings[key] for key in keys if key in self._ratings}
+
+    def set(self, player_id: int, role: str, mu: float, sigma: float):
+        with self._lock:
+            self._ratings[player_id, role] = (float(mu), float(sigma))
+
+    def invalidate(self, player_id: int, role: str):
+        with self._lock:
+            self._ratings.pop((player_id, role), None)
+
+
+rating_cache = RatingCache()
+
+
+@receiver(post_save, sender=PlayerRating)
+@receiver(post_delete, sender=PlayerRating)
+def invalidate_rating(sender, instance, **kwargs):
+    rating_cache.invalidate(instance.player_id, instance.role)
@@ -1,96 +1,222 @@
-from collections import defaultdict
-from typing import Dict, List, Tuple
+import copy
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from inhouse.models import QueuePlayer, PlayerRating
 from inhouse.common_utils.fields import roles_list
+from inhouse.common_utils.rating_cache import Ratings, rating_cache
 from django.core.cache import cache
+from django.utils import timezone
+
+
+def _age_key(queue_player: QueuePlayer):
+    # Queue players fresh from a save can have naive queue times, which are in the TIME_ZONE like the saved ones
+    queue_time = queue_player.queue_time
+
+    if timezone.is_naive(queue_time):
+        queue_time = timezone.make_aware(queue_time)
+
+    return queue_time, queue_player.id
 
 
 class GameQueue:
     """
     Represents the current queue state in a given channel
-    """
 
-    queue_players: List[QueuePlayer]
+    Queue players are indexed by role in age order once, and the index is updated incrementally with add and remove
+    """
 
     def __init__(self, channel_id: int, potential_queue_players=None):
+        self.channel_id = channel_id
+        self.server_id = None
+
+        # We keep the ratings as floats so the matchmaking never has to query them again
+        #   {(player_id, role)} = (mu, sigma), read from the rating cache
+        self.ratings: Ratings = {}
+
+        # {role} = queue players in the role, oldest first
+        self._role_queues: Dict[str, List[QueuePlayer]] = {role: [] for role in roles_list}
+
+        # {queue player id} = queue player, which is also the duo map as duo_id is the id of the partner
+        self._queue_players_by_id: Dict[int, QueuePlayer] = {}
+
+        # Matchmaking order of the queue players, computed again after a change
+        self._queue_players: Optional[List[QueuePlayer]] = None
 
         if potential_queue_players == None:
             potential_queue_players = QueuePlayer.objects.filter(channel_id=channel_id,
-                                                                ready_check_id__isnull=True).order_by('queue_time')
+                                                                ready_check_id__isnull=True).select_related('player')
 
         # If we have no player in queue, we stop there
         if not potential_queue_players:
-            self.server_id = None
-            self.queue_players = []
             return
         # Else, we have our server_id from the players themselves
         else:
             for p in potential_queue_players[:1]:
                 self.server_id = p.player.server_id
-        
-        if isinstance(potential_queue_players, list):
-            self.queue_players = potential_queue_players
-        else:
-            self.queue_players = potential_queue_players.filter(player__server_id=self.server_id)
 
-        for queue_player in self.queue_players:
-            try:
-                assert queue_player.player.ratings.get(role=queue_player.role)
-            except PlayerRating.DoesNotExist:
-                # If not, we create a new rating object
-                PlayerRating.new(
-                    queue_player.player, queue_player.role
-                )
+        if not isinstance(potential_queue_players, list):
+            potential_queue_players = potential_queue_players.filter(player__server_id=self.server_id)
+
+        self.add_many(potential_queue_players)
 
+    def add(self, queue_player: QueuePlayer, ratings: Optional[Ratings] = None):
+        """
+        Adds the queue player to the queue, or updates him if he is already in it
+        """
+        self.add_many([queue_player], ratings)
+
+    def add_many(self, queue_players: Iterable[QueuePlayer], ratings: Optional[Ratings] = None):
+        """
+        Adds the queue players, the ratings being read from load_ratings if not given
+
+        Queue players given with their player and ratings loaded are added without touching the database
+        """
+        queue_players = list(queue_players)
+
+        if not queue_players:
+            return
+
+        if self.server_id is None:
+            self.server_id = queue_players[0].player.server_id
+
+        for queue_player in queue_players:
+            self._unindex(queue_player.id)
+
+            self._queue_players_by_id[queue_player.id] = queue_player
+            self._role_queues[queue_player.role].append(queue_player)
+
+        for role in {queue_player.role for queue_player in queue_players}:
+            self._role_queues[role].sort(key=_age_key)
+
+        if ratings is None:
+            ratings = self.load_ratings({(qp.player_id, qp.role) for qp in queue_players})
+
+        self.ratings.update(ratings)
+
+        self._queue_players = None
+
+    def remove(self, queue_player: QueuePlayer):
+        """
+        Removes the queue player from the queue, doing nothing if he is not in it
+
+        His duo partner loses his duo, as the database sets it to NULL when the row is deleted
+        """
+        self._unindex(queue_player.id, clear_duo=True)
+        self._queue_players = None
+
+    def set_ready_check(self, player_ids: Iterable[int], ready_check_id: Optional[int]):
+        """
+        Marks the queue players of the players as in the ready-check, or back in queue if ready_check_id is None
+
+        start_ready_check and cancel_ready_check update the rows without sending any signal, so the queue is marked
+        by the matchmaker itself
+        """
+        player_ids = set(player_ids)
+
+        for queue_player in self._queue_players_by_id.values():
+            if queue_player.player_id in player_ids:
+                queue_player.ready_check_id = ready_check_id
+
+    def remove_ready_checks(self):
+        """
+        Removes the queue players in a ready-check, which must not be matched in another game
+        """
+        for queue_player in [qp for qp in self._queue_players_by_id.values() if qp.ready_check_id is not None]:
+            self._unindex(queue_player.id)
+
+        self._queue_players = None
+
+    def copy(self) -> "GameQueue":
+        """
+        Snapshot of the queue, which later joins and leaves do not change
+        """
+        queue = copy.copy(self)
+
+        queue.ratings = dict(self.ratings)
+        queue._role_queues = {role: list(role_queue) for role, role_queue in self._role_queues.items()}
+        queue._queue_players_by_id = dict(self._queue_players_by_id)
+
+        return queue
+
+    def _unindex(self, queue_player_id: int, clear_duo: bool = False):
+        queue_player = self._queue_players_by_id.pop(queue_player_id, None)
+
+        if queue_player:
+            self._role_queues[queue_player.role].remove(queue_player)
+            self.ratings.pop((queue_player.player_id, queue_player.role), None)
+
+            # Otherwise the partner would point to a missing duo and be left out of every search
+            partner = self._queue_players_by_id.get(queue_player.duo_id) if clear_duo else None
+
+            if partner and partner.duo_id == queue_player.id:
+                partner.duo_id = None
+
+    @staticmethod
+    def load_ratings(player_roles: set) -> Ratings:
+        """
+        Reads the ratings of the (player_id, role) pairs from the rating cache
+        """
+        ratings = rating_cache.get_many(player_roles)
+
+        # Players who never played a role get the default rating, all created with a single query
+        missing_ratings = player_roles.difference(ratings)
+
+        if missing_ratings:
+            PlayerRating.new_many(missing_ratings)
+            ratings.update(rating_cache.get_many(missing_ratings))
+
+        return ratings
+
+    def duo_of(self, queue_player: QueuePlayer) -> Optional[QueuePlayer]:
+        return self._queue_players_by_id.get(queue_player.duo_id) if queue_player.duo_id is not None else None
+
+    @property
+    def queue_players(self) -> List[QueuePlayer]:
+        """
+        Queue players in matchmaking order, which takes their age in queue into account
+        """
+        if self._queue_players is None:
+            self._queue_players = self._matchmaking_order()
+
+        return self._queue_players
+
+    def _matchmaking_order(self) -> List[QueuePlayer]:
         # The starting queue is made of the 2 players per role who have been in queue the longest
         #   We also add any duos *required* for the game to fire
-        starting_queue = defaultdict(list)
+        starting_queue = {role: [] for role in roles_list}
 
-        for role in self.queue_players_dict:
-            for qp in self.queue_players_dict[role]:
+        for role in roles_list:
+            for qp in self._role_queues[role]:
 
                 # If we already have 2 players in that role, we continue
                 if len(starting_queue[role]) >= 2:
-                    continue
+                    break
 
                 # Else we add our current player if he’s not there yet (could have been added by his duo)
-                # TODO LOW PRIO cleanup that ugly code
-                if not filter(lambda x: x.player_id == qp.player_id, starting_queue[role]):
+                if qp not in starting_queue[role]:
                     starting_queue[role].append(qp)
 
-                # If he has a duo, we add it if he’s not in queue for his role already
-                if qp.duo_id is not None:
-                    duo_role = qp.duo.role
-
-                    # We add the duo as part of the queue for his role *if he’s not yet in it*
-                    # TODO LOW PRIO find a more readable syntax, all those list comprehensions are really bad
-                    if not filter(lambda x: x.player_id == qp.duo_id , starting_queue[duo_role]):
-                        if len(starting_queue[duo_role]) >= 2:
-                            starting_queue[duo_role].pop()
-                        starting_queue[duo_role].append(qp.duo)
-
-        # Afterwards we fill the rest of the queue with players in chronological order
+                # If he has a duo, we add him as part of the queue for his role *if he’s not yet in it*
+                duo = self.duo_of(qp)
 
-        age_sorted_queue_players = sum(
-            list(starting_queue.values()), []
-        )  # Flattening the QueuePlayer objects to a single list
+                if duo and duo not in starting_queue[duo.role]:
+                    if len(starting_queue[duo.role]) >= 2:
+                        starting_queue[duo.role].pop()
+                    starting_queue[duo.role].append(duo)
 
-        # This should always be the first game we try
-        assert len(age_sorted_queue_players) <= 10
+        age_sorted_queue_players = [qp for role in roles_list for qp in starting_queue[role]]
 
-        # We create a (role, id) list to see who is already in queue more easily
-        #   Simple equality does not work because the qp.duo objects are != from the solo qp objects
-        age_sorted_queue_players_ids = [(qp.player_id, qp.role) for qp in age_sorted_queue_players]
+        # Afterwards we fill the rest of the queue with players in chronological order
+        starting_queue_ids = {qp.id for qp in age_sorted_queue_players}
 
-        age_sorted_queue_players += [
-            qp for qp in self.queue_players if (qp.player_id, qp.role) not in age_sorted_queue_players_ids
-        ]
+        age_sorted_queue_players += sorted(
+            (qp for qp in self._queue_players_by_id.values() if qp.id not in starting_queue_ids), key=_age_key
+        )
 
-        self.queue_players = age_sorted_queue_players
+        return age_sorted_queue_players
 
     def __len__(self):
-        return len(self.queue_players)
+        return len(self._queue_players_by_id)
 
     def __eq__(self, other):
         if type(other) != GameQueue:
@@ -104,10 +230,8 @@ class GameQueue:
     def __str__(self):
         rows = []
 
-        for role in roles_list:
-            rows.append(
-                f"{role}\t" + " ".join(qp.player.name for qp in self.queue_players if qp.role == role)
-            )
+        for role, role_queue in self._role_queues.items():
+            rows.append(f"{role}\t" + " ".join(qp.player.name for qp in role_queue))
 
         duos_strings = []
         for duo in self.duos:
@@ -120,10 +244,12 @@ class GameQueue:
     @property
     def queue_players_dict(self) -> Dict[str, List[QueuePlayer]]:
         """
-        This dictionary will always have all roles included
+        This dictionary will always have all roles included, with the queue players from oldest to newest
+
+        It is the index of the queue and should not be modified
         """
-        return {role: [player for player in self.queue_players if player.role == role] for role in roles_list}
+        return self._role_queues
 
     @property
     def duos(self) -> List[Tuple[QueuePlayer, QueuePlayer]]:
-        return [(qp, qp.duo) for qp in filter(lambda x: bool(x.duo), self.queue_players)]
+        return [(qp, self.duo_of(qp)) for qp in self.queue_players if self.duo_of(qp)]
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import List, Optional, Set
 from psycopg2.errors import UniqueViolation
 
@@ -8,6 +8,9 @@ from inhouse.exceptions .queue import *
 
 from inhouse.common_utils.fields import roles_list
 
+from django.db.models import Q
+from django.utils import timezone
+
 from inhouse.models import QueuePlayer, Player
 from inhouse.common_utils.get_last_game import get_last_game
 import logging
@@ -62,14 +65,19 @@ def add_player(
     player.save()
 
     # Finally, we actually add the player to the queue
-    queue_time = datetime.now() if not jump_ahead else datetime.now() - timedelta(hours=24)
+    queue_time = timezone.now() if not jump_ahead else timezone.now() - timedelta(hours=24)
     queues = QueuePlayer.objects.filter(channel_id=channel_id, player_id=player_id,role=role)
     if queues:
-        queues.update(queue_time=queue_time)
+        # Saved one by one so the queues updated by the save signal get the new queue time
+        for queue_player in queues:
+            queue_player.player = player
+            queue_player.queue_time = queue_time
+            queue_player.save(update_fields=['queue_time'])
     else:
         queue_player = QueuePlayer()
         queue_player.channel_id = channel_id
-        queue_player.player_id = player_id
+        # The player is set as an object so the queues updated by the save signal do not have to query it
+        queue_player.player = player
         queue_player.role = role
         queue_player.queue_time = queue_time
         queue_player.save()
@@ -112,7 +120,9 @@ def validate_ready_check(ready_check_id: int):
     """
     When a ready check is validated, we drop all players from all queues
     """
-    QueuePlayer.objects.filter(ready_check_id=ready_check_id, player_id__in=player_ids).delete()
+    player_ids = QueuePlayer.objects.filter(ready_check_id=ready_check_id).values('player_id')
+
+    QueuePlayer.objects.filter(player_id__in=player_ids).delete()
 
 def cancel_ready_check(
     ready_check_id: int, ids_to_drop: Optional[List[int]], channel_id=None, server_id=None,
@@ -131,18 +141,15 @@ def cancel_ready_check(
             raise Exception("channel_id and server_id should not be used together here")
 
         players_query = QueuePlayer.objects.filter(player_id__in=ids_to_drop)
-        duos_query = QueuePlayer.objects.filter(duo_id__in=ids_to_drop)
         # This removes the player from *all* queues in the server (timeout)
         if server_id:
             players_query = players_query.filter(channel__server_id=server_id)
-            duos_query = duos_query.filter(channel__server_id=server_id)
 
         if channel_id:
             players_query = players_query.filter(channel_id=channel_id)
-            duos_query = duos_query.filter(channel_id =channel_id)
 
+        # The duo of their partners is set to NULL by the deletion, and cleared in the queues by the delete signal
         players_query.delete()
-        duos_query.update(duo=None)
 
 def cancel_all_ready_checks():
     """
@@ -225,5 +232,9 @@ def add_duo(
 def remove_duo(player_id: int, channel_id: int):
     # Removes duos for all roles for this player in this channel
     # This could be called during a ready-check but it shouldn’t be too much of an issue
-    QueuePlayer.objects.filter(player_id=player_id, channel_id=channel_id).update(duo_id=None)
-    QueuePlayer.objects.filter(duo__player_id=player_id, channel_id=channel_id).update(duo_id=None)
\ No newline at end of file
+    # Saved one by one so the queues updated by the save signal drop the duo
+    for queue_player in QueuePlayer.objects.filter(
+        Q(player_id=player_id) | Q(duo__player_id=player_id), channel_id=channel_id
+    ).select_related('player'):
+        queue_player.duo = None
+        queue_player.save(update_fields=['duo'])
\ No newline at end of file
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from django.core.management.base import BaseCommand
+from tabulate import tabulate
+
+from inhouse.matchmaking_logic.benchmark import ENGINES, run_benchmark
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark do matchmaking em filas sintéticas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines',
+                dest='engines',
+                nargs='+',
+                choices=list(ENGINES),
+                default=['vectorized', 'branch_and_bound', 'meet_in_the_middle'],
+                help='Motores de matchmaking a serem medidos')
+
+        parser.add_argument('--players-per-role',
+                dest='players_per_role',
+                nargs='+',
+                type=int,
+                default=[2, 3, 4, 6],
+                help='Quantidade de jogadores por role em cada fila')
+
+        parser.add_argument('--seeds',
+                dest='seeds',
+                type=int,
+                default=10,
+                help='Quantidade de filas geradas (uma por seed), cada uma medida em um tick')
+
+        parser.add_argument('--duo-density',
+                dest='duo_density',
+                type=float,
+                default=0.2,
+                help='Probabilidade de um jogador estar em duo')
+
+        parser.add_argument('--rating-spread',
+                dest='rating_spread',
+                type=float,
+                default=6.0,
+                help='Desvio padrão do trueskill mu dos jogadores')
+
+        parser.add_argument('--multi-role-density',
+                dest='multi_role_density',
+                type=float,
+                default=0.2,
+                help='Probabilidade de um jogador estar na fila em mais de uma role')
+
+        parser.add_argument('--threshold',
+                dest='threshold',
+                type=float,
+                default=0.1,
+                help='game_quality_threshold usado pela matchmaking')
+
+    def handle(self, *args, **options):
+        # The matchmaking logs every queue it searches, which would be measured as well
+        logging.getLogger("inhouse_logger").setLevel(logging.WARNING)
+
+        rows = []
+
+        for players_per_role in options['players_per_role']:
+            for engine in options['engines']:
+                result = run_benchmark(
+                    engine,
+                    players_per_role,
+                    seeds=options['seeds'],
+                    game_quality_threshold=options['threshold'],
+                    duo_density=options['duo_density'],
+                    rating_spread=options['rating_spread'],
+                    multi_role_density=options['multi_role_density'],
+                )
+
+                rows.append([
+                    result.engine,
+                    result.players_per_role,
+                    result.ticks,
+                    f"{result.compositions_per_second:,.0f}",
+                    f"{result.p50_ms:.1f}",
+                    f"{result.p99_ms:.1f}",
+                    f"{result.peak_memory_mib:.1f}",
+                ])
+
+        self.stdout.write(tabulate(
+            rows,
+            headers=['engine', 'players/role', 'ticks', 'compositions/s', 'p50 ms', 'p99 ms', 'peak MiB'],
+        ))
@@ -45,8 +45,8 @@ class Command(BaseCommand):
             'jsonb': JSONField,
             'date': fields.DateField,
             'numeric': fields.DecimalField,
-            'double precision': fields.DecimalField,
-            'float8': fields.DecimalField,
+            'double precision': fields.FloatField,
+            'float8': fields.FloatField,
             'int2': fields.PositiveSmallIntegerField,
         }
 
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inhouse.common_utils.constants import PREFIX
+from inhouse.matchmaking_logic.recompute_ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+
+    help = 'Recalcula todos os ratings a partir do histórico de jogos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server',
+                dest='server_id',
+                type=int,
+                default=None,
+                help='ID do servidor a ser recalculado. Se não for definido, todos os servidores são recalculados')
+        parser.add_argument('--noinput', '--no-input',
+                action='store_false',
+                dest='interactive',
+                help='Não pede confirmação antes de recalcular os ratings')
+
+    def handle(self, *args, **options):
+        logging.getLogger().setLevel(logging.INFO)
+
+        # The bot keeps the ratings of the matchmaking in memory, which this process cannot refresh
+        self.stderr.write(self.style.WARNING(
+            "ATENÇÃO: um robô em execução continua usando os ratings antigos na matchmaking. "
+            f"Com o robô rodando, prefira {PREFIX}admin recompute, ou use {PREFIX}admin reload_ratings "
+            "depois deste comando."
+        ))
+
+        if options['interactive']:
+            confirm = input("Digite 'sim' para continuar: ")
+
+            if confirm != 'sim':
+                raise CommandError('Recálculo cancelado.')
+
+        result = recompute_ratings(server_id=options['server_id'])
+
+        self.stdout.write(
+            f"{result.games} jogos reprocessados em {result.duration:.2f}s, "
+            f"{result.ratings_updated} ratings e {result.participants_updated} participantes atualizados"
+        )
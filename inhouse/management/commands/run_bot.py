@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from django.core.management.base import BaseCommand, CommandError
-import sys, os
+import sys
 import re
 from inhouse.robot import InhouseBot
 import logging
@@ -58,8 +58,6 @@ class Command(BaseCommand):
         logging.basicConfig(format='%(asctime)s,%(msecs)d %(levelname)-8s [%(filename)s:%(lineno)d] %(message)s',datefmt='%Y-%m-%d:%H:%M:%S')
         logging.info(f"Iniciando o robo no papel {role if role else 'QUEUE e RANKING'}")
         
-        os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
-        
         bot = InhouseBot()
         bot.run()
 
@@ -1,6 +1,6 @@
-from inhouse.matchmaking_logic.find_best_game import find_best_game
+from inhouse.matchmaking_logic.search_pool import find_best_game_async, find_best_games_async
 from inhouse.matchmaking_logic.evaluate_game import evaluate_game
-from inhouse.matchmaking_logic.score_game import score_game_from_winning_player
+from inhouse.matchmaking_logic.score_game import change_game_winner
 import trueskill
 
 trueskill.DRAW_PROBABILITY = 0.
@@ -0,0 +1,342 @@
+import itertools
+import math
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import trueskill
+
+from inhouse.common_utils.fields import roles_list
+from inhouse.matchmaking_logic import branch_and_bound, meet_in_the_middle, vectorized
+from inhouse.matchmaking_logic.candidate_game import CandidateGame, Solver
+from inhouse.matchmaking_logic.find_best_game import get_search_space, search_best_composition
+from inhouse.matchmaking_logic.search_space import SearchSpace
+
+# Number of compositions scored per tick by the evaluate_game engine
+EVALUATE_GAME_SAMPLE = 1000
+
+
+@dataclass
+class SyntheticPlayer:
+    """
+    In-memory stand-in for a Player
+    """
+
+    id: int
+    name: str
+
+
+@dataclass
+class SyntheticQueuePlayer:
+    """
+    In-memory stand-in for a QueuePlayer, never written to the database
+    """
+
+    id: int
+    player: SyntheticPlayer
+    role: str
+    duo: Optional["SyntheticQueuePlayer"] = field(default=None, repr=False, compare=False)
+
+    @property
+    def player_id(self) -> int:
+        return self.player.id
+
+    @property
+    def duo_id(self) -> Optional[int]:
+        return self.duo.id if self.duo else None
+
+    def __str__(self):
+        return f"{self.player.name} - {self.role}"
+
+
+class SyntheticQueue:
+    """
+    Stand-in for GameQueue, the ratings dictionary replacing the PlayerRating rows
+    """
+
+    def __init__(
+        self, queue_players: List[SyntheticQueuePlayer], ratings: Dict[Tuple[int, str], Tuple[float, float]]
+    ):
+        self.queue_players = queue_players
+        self.ratings = ratings
+
+    def __len__(self):
+        return len(self.queue_players)
+
+    def __str__(self):
+        return "\n".join(
+            f"{role}\t" + " ".join(qp.player.name for qp in self.queue_players if qp.role == role)
+            for role in roles_list
+        )
+
+    @property
+    def queue_players_dict(self) -> Dict[str, List[SyntheticQueuePlayer]]:
+        return {role: [qp for qp in self.queue_players if qp.role == role] for role in roles_list}
+
+
+def synthetic_queue(
+    seed: int,
+    players_per_role: int,
+    duo_density: float = 0.2,
+    rating_spread: float = 6.0,
+    multi_role_density: float = 0.2,
+) -> SyntheticQueue:
+    """
+    Generates a reproducible queue with players_per_role queue players in every role
+
+    Args:
+        seed: seed of the random generator, the same arguments always give the same queue
+        duo_density: probability for a queue player to be in a duo with a queue player of another role
+        rating_spread: standard deviation of the trueskill mu around 25
+        multi_role_density: probability for a queue player to be a player already queuing for another role
+    """
+    rng = random.Random(seed)
+
+    players: List[SyntheticPlayer] = []
+    queue_players: List[SyntheticQueuePlayer] = []
+    ratings = {}
+
+    for role in roles_list:
+        for _ in range(players_per_role):
+            # Players already in queue for another role can also queue for this one
+            candidates = [p for p in players if (p.id, role) not in ratings]
+
+            if candidates and rng.random() < multi_role_density:
+                player = rng.choice(candidates)
+            else:
+                player = SyntheticPlayer(id=len(players) + 1, name=f"Player{len(players) + 1}")
+                players.append(player)
+
+            queue_players.append(SyntheticQueuePlayer(id=len(queue_players) + 1, player=player, role=role))
+            ratings[player.id, role] = (rng.gauss(25, rating_spread), rng.uniform(2, 25 / 3))
+
+    for qp in queue_players:
+        if qp.duo is None and rng.random() < duo_density:
+            partners = [
+                other
+                for other in queue_players
+                if other.duo is None and other.role != qp.role and other.player_id != qp.player_id
+            ]
+
+            if partners:
+                qp.duo = rng.choice(partners)
+                qp.duo.duo = qp
+
+    # Like GameQueue, the 2 oldest queue players of each role come first and the rest follow in age order
+    rng.shuffle(queue_players)
+    starting_queue = [qp for role in roles_list for qp in [qp for qp in queue_players if qp.role == role][:2]]
+    queue_players = starting_queue + [qp for qp in queue_players if qp not in starting_queue]
+
+    return SyntheticQueue(queue_players, ratings)
+
+
+def _counting_solver(solver: Solver, counter: List[int]) -> Solver:
+    """
+    Wraps the solver to count the compositions of the role pairs products it is given
+    """
+
+    def counting_solver(space, options, best_score, deadline=None, stats=None):
+        counter[0] += math.prod(len(role_options) for role_options in options)
+        return solver(space, options, best_score, deadline, stats)
+
+    return counting_solver
+
+
+def _solver_engine(solver: Solver) -> Callable[[SyntheticQueue, float], Tuple[float, int]]:
+    def run(queue: SyntheticQueue, game_quality_threshold: float) -> Tuple[float, int]:
+        counter = [0]
+
+        start = time.perf_counter()
+        search_best_composition(get_search_space(queue), game_quality_threshold, _counting_solver(solver, counter))
+
+        return time.perf_counter() - start, counter[0]
+
+    return run
+
+
+def _baseline_evaluate_game(blue_team: List[Tuple[float, float]], red_team: List[Tuple[float, float]]) -> float:
+    """
+    Frozen copy of the original evaluate_game, on the (mu, sigma) of both teams
+    """
+    blue_team_ratings = [trueskill.Rating(mu=mu, sigma=sigma) for mu, sigma in blue_team]
+    red_team_ratings = [trueskill.Rating(mu=mu, sigma=sigma) for mu, sigma in red_team]
+
+    delta_mu = sum(r.mu for r in blue_team_ratings) - sum(r.mu for r in red_team_ratings)
+
+    sum_sigma = sum(r.sigma ** 2 for r in itertools.chain(blue_team_ratings, red_team_ratings))
+
+    size = len(blue_team_ratings) + len(red_team_ratings)
+
+    denominator = math.sqrt(size * (trueskill.BETA * trueskill.BETA) + sum_sigma)
+
+    ts = trueskill.global_env()
+
+    return ts.cdf(float(delta_mu) / float(denominator))
+
+
+def _baseline_find_best_game_for_queue_players(
+    queue_players: List[SyntheticQueuePlayer], ratings: Dict[Tuple[int, str], Tuple[float, float]], counter: List[int]
+) -> Optional[float]:
+    """
+    Frozen copy of the original exhaustive loop, returning the score of the best game
+
+    The original built a Game from each composition, which read its participants from the database. Here the
+    ratings come from the dictionary, so the baseline measured is faster than the original code was. Duos are
+    matched on the queue player id, which is what duo_id points to.
+    """
+    role_permutations = []
+
+    for role in roles_list:
+        role_permutations.append(
+            [
+                queue_player
+                for queue_player in itertools.permutations([qp for qp in queue_players if qp.role == role], 2)
+            ]
+        )
+
+    best_score = 1
+    best_game = None
+
+    for team_composition in itertools.product(*role_permutations):
+        counter[0] += 1
+
+        shuffle = bool(random.getrandbits(1))
+
+        queue_players_dict = {
+            ("BLUE" if bool(tuple_idx) == shuffle else "RED", roles_list[role_idx]): queue_players_tuple[
+                tuple_idx
+            ]
+            for role_idx, queue_players_tuple in enumerate(team_composition)
+            for tuple_idx in (0, 1)
+        }
+
+        duos_not_in_same_team = False
+        for team_tuple, qp in queue_players_dict.items():
+            if qp.duo_id is not None:
+                try:
+                    next(
+                        duo_qp
+                        for duo_team_tuple, duo_qp in queue_players_dict.items()
+                        if duo_team_tuple[0] == team_tuple[0] and duo_qp.id == qp.duo_id
+                    )
+                except StopIteration:
+                    duos_not_in_same_team = True
+                    continue
+
+        if duos_not_in_same_team:
+            continue
+
+        players = {k: qp.player for k, qp in queue_players_dict.items()}
+
+        if set(p.id for p in players.values()).__len__() != 10:
+            continue
+
+        blue_expected_winrate = _baseline_evaluate_game(
+            [ratings[p.id, role] for (side, role), p in players.items() if side == "BLUE"],
+            [ratings[p.id, role] for (side, role), p in players.items() if side == "RED"],
+        )
+        matchmaking_score = abs(0.5 - blue_expected_winrate)
+
+        if matchmaking_score < best_score:
+            best_game = team_composition
+            best_score = matchmaking_score
+            if best_score < 0.01:
+                break
+
+    return best_score if best_game else None
+
+
+def _baseline_engine(queue: SyntheticQueue, game_quality_threshold: float) -> Tuple[float, int]:
+    """
+    Runs the original find_best_game, growing the queue prefix until a game beats the threshold
+    """
+    counter = [0]
+
+    start = time.perf_counter()
+    for players_threshold in range(10, len(queue) + 1):
+        best_score = _baseline_find_best_game_for_queue_players(
+            queue.queue_players[:players_threshold], queue.ratings, counter
+        )
+
+        if best_score is not None and best_score < game_quality_threshold:
+            break
+
+    return time.perf_counter() - start, counter[0]
+
+
+def _evaluate_game_engine(queue: SyntheticQueue, game_quality_threshold: float) -> Tuple[float, int]:
+    space = SearchSpace(queue.queue_players, queue.ratings)
+    compositions = list(itertools.islice(space.constraints.compositions(space.role_options()), EVALUATE_GAME_SAMPLE))
+
+    start = time.perf_counter()
+    for composition in compositions:
+        CandidateGame.from_composition(queue.queue_players, composition, queue.ratings)
+
+    return time.perf_counter() - start, len(compositions)
+
+
+# Every engine runs a matchmaking tick on a queue and returns its duration and the number of compositions searched
+#   For the solvers, it is the size of the role pairs products they were given, including pruned compositions
+ENGINES: Dict[str, Callable[[SyntheticQueue, float], Tuple[float, int]]] = {
+    "vectorized": _solver_engine(vectorized.find_best_composition),
+    "branch_and_bound": _solver_engine(branch_and_bound.find_best_composition),
+    "meet_in_the_middle": _solver_engine(meet_in_the_middle.find_best_composition),
+    "baseline": _baseline_engine,
+    "evaluate_game": _evaluate_game_engine,
+}
+
+
+@dataclass
+class BenchmarkResult:
+    engine: str
+    players_per_role: int
+    ticks: int
+    compositions_per_second: float
+    p50_ms: float
+    p99_ms: float
+    peak_memory_mib: float
+
+
+def run_benchmark(
+    engine: str,
+    players_per_role: int,
+    seeds: int = 10,
+    game_quality_threshold: float = 0.1,
+    **queue_options,
+) -> BenchmarkResult:
+    """
+    Runs one matchmaking tick per seeded queue and measures it
+
+    Ticks stop before the chosen game would be written to the database. Peak memory is measured in a second
+    pass, as tracemalloc slows down the Python code a lot
+    """
+    run = ENGINES[engine]
+    queues = [synthetic_queue(seed, players_per_role, **queue_options) for seed in range(seeds)]
+
+    durations = []
+    compositions = 0
+
+    for queue in queues:
+        duration, count = run(queue, game_quality_threshold)
+        durations.append(duration)
+        compositions += count
+
+    peak_memory = 0
+    for queue in queues:
+        tracemalloc.start()
+        run(queue, game_quality_threshold)
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        engine=engine,
+        players_per_role=players_per_role,
+        ticks=seeds,
+        compositions_per_second=compositions / sum(durations),
+        p50_ms=float(np.percentile(durations, 50)) * 1000,
+        p99_ms=float(np.percentile(durations, 99)) * 1000,
+        peak_memory_mib=peak_memory / 2 ** 20,
+    )
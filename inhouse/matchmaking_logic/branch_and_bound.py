@@ -0,0 +1,122 @@
+from typing import Dict, List, Optional, Tuple
+
+from inhouse.common_utils.fields import roles_list
+from inhouse.matchmaking_logic.deadline import Deadline
+from inhouse.matchmaking_logic.search_space import Composition, RoleOptions, SearchSpace
+from inhouse.matchmaking_logic.telemetry import SearchStats
+from inhouse.matchmaking_logic.win_probability import win_probability
+
+# Margin given to the bounds so the cdf approximation can never prune the exhaustive search result
+BOUND_TOLERANCE = 1e-7
+
+
+def find_best_composition(
+    space: SearchSpace,
+    options: RoleOptions,
+    best_score: float = 1,
+    deadline: Optional[Deadline] = None,
+    stats: Optional[SearchStats] = None,
+) -> Optional[Tuple[Composition, float]]:
+    """
+    Depth-first search over the roles which prunes branches that cannot beat the current best score
+
+    The bound uses the partial blue-minus-red mu sum and the min/max delta_mu the remaining roles can reach.
+    Compositions are visited in the same order as CompositionConstraints.compositions and scored with the same
+    win probability kernel, so the result is the same, unless the deadline cuts the search short
+    """
+    if not all(options):
+        return None
+
+    mu = space.mu
+    sigma_squared = [sigma * sigma for sigma in space.sigma]
+
+    # Per role contributions of each (blue, red) pair
+    deltas = [[mu[b] - mu[r] for b, r in role_options] for role_options in options]
+    variances = [[sigma_squared[b] + sigma_squared[r] for b, r in role_options] for role_options in options]
+
+    # Bounds of what the roles after role_idx can still add, the last item being for the full composition
+    remaining_min_delta = [0.0] * (len(roles_list) + 1)
+    remaining_max_delta = [0.0] * (len(roles_list) + 1)
+    remaining_max_variance = [0.0] * (len(roles_list) + 1)
+    for role_idx in reversed(range(len(roles_list))):
+        remaining_min_delta[role_idx] = remaining_min_delta[role_idx + 1] + min(deltas[role_idx])
+        remaining_max_delta[role_idx] = remaining_max_delta[role_idx + 1] + max(deltas[role_idx])
+        remaining_max_variance[role_idx] = remaining_max_variance[role_idx + 1] + max(variances[role_idx])
+
+    constraints = space.constraints
+
+    players = 2 * len(roles_list)
+
+    best_composition = None
+
+    composition: List[Tuple[int, int]] = []
+    sides: Dict[int, int] = {}
+
+    def lower_bound(role_idx: int, delta: float, variance: float) -> float:
+        lowest = delta + remaining_min_delta[role_idx]
+        highest = delta + remaining_max_delta[role_idx]
+        closest_to_zero = 0.0 if lowest <= 0 <= highest else min(abs(lowest), abs(highest))
+
+        return abs(0.5 - win_probability(closest_to_zero, variance + remaining_max_variance[role_idx], players))
+
+    def search(role_idx: int, delta: float, variance: float) -> bool:
+        """
+        Returns True when the search can stop as a good enough game was found
+        """
+        nonlocal best_score, best_composition
+
+        if role_idx == len(roles_list):
+            # The delta and variance are summed in role order, like the vectorized solver does
+            score = abs(0.5 - win_probability(delta, variance, players))
+
+            if stats:
+                stats.compositions_scored += 1
+
+            if score < best_score:
+                best_score = score
+                best_composition = tuple(composition)
+
+            # Same early exit as the exhaustive search
+            return best_score < 0.01
+
+        if lower_bound(role_idx, delta, variance) - BOUND_TOLERANCE >= best_score:
+            if stats:
+                stats.pruned += 1
+            return False
+
+        # Running out of time stops the search like a good enough game, keeping the best composition so far
+        if deadline and deadline.check():
+            return True
+
+        for pair, pair_delta, pair_variance in zip(options[role_idx], deltas[role_idx], variances[role_idx]):
+            if stats:
+                stats.compositions_generated += 1
+
+            reason = constraints.rejection(role_idx, pair, sides)
+            if reason:
+                if stats:
+                    stats.reject(reason)
+                continue
+
+            composition.append(pair)
+            sides[pair[0]], sides[pair[1]] = 0, 1
+
+            done = search(role_idx + 1, delta + pair_delta, variance + pair_variance)
+
+            composition.pop()
+            del sides[pair[0]], sides[pair[1]]
+
+            if done:
+                return True
+
+            # The best score might have improved enough to prune the rest of this role
+            if lower_bound(role_idx, delta, variance) - BOUND_TOLERANCE >= best_score:
+                if stats:
+                    stats.pruned += 1
+                return False
+
+        return False
+
+    search(0, 0.0, 0.0)
+
+    return (best_composition, best_score) if best_composition else None
@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from inhouse.models import Game, Player, QueuePlayer
+from inhouse.common_utils.fields import roles_list
+from inhouse.matchmaking_logic.deadline import Deadline
+from inhouse.matchmaking_logic.evaluate_game import evaluate_game
+from inhouse.matchmaking_logic.search_space import Composition, RoleOptions, SearchSpace
+from inhouse.matchmaking_logic.telemetry import SearchStats
+
+# A solver returns the best (composition, score) among the options if it beats the given best score
+#   When the optional deadline expires, it returns the best composition it found so far
+#   Its work is counted in the optional stats
+Solver = Callable[
+    [SearchSpace, RoleOptions, float, Optional[Deadline], Optional[SearchStats]], Optional[Tuple[Composition, float]]
+]
+
+
+@dataclass
+class CandidateParticipant:
+    """
+    In-memory equivalent of a GameParticipant, only used during the matchmaking search
+    """
+
+    queue_player: QueuePlayer
+    side: str
+    role: str
+    trueskill_mu: float
+    trueskill_sigma: float
+
+    @property
+    def player(self) -> Player:
+        return self.queue_player.player
+
+    @property
+    def player_id(self) -> int:
+        return self.queue_player.player_id
+
+
+@dataclass
+class CandidateTeams:
+    BLUE: List[CandidateParticipant]
+    RED: List[CandidateParticipant]
+
+
+class CandidateGame:
+    """
+    A team composition that was not written to the database
+
+    It exposes the same teams interface as Game so evaluate_game can score it without any query
+    """
+
+    def __init__(
+        self,
+        queue_players_dict: Dict[Tuple[str, str], QueuePlayer],
+        ratings: Dict[Tuple[int, str], Tuple[float, float]],
+    ):
+        # {(team, role)} = QueuePlayer, with ratings being {(player_id, role)} = (mu, sigma)
+        self.participants = [
+            CandidateParticipant(qp, side, role, *ratings[qp.player_id, role])
+            for (side, role), qp in queue_players_dict.items()
+        ]
+
+        self.teams = CandidateTeams(
+            BLUE=[p for p in self.participants if p.side == "BLUE"],
+            RED=[p for p in self.participants if p.side == "RED"],
+        )
+
+        self.blue_expected_winrate = evaluate_game(self)
+
+    @classmethod
+    def from_composition(
+        cls,
+        queue_players: List[QueuePlayer],
+        composition: Composition,
+        ratings: Dict[Tuple[int, str], Tuple[float, float]],
+        swap_sides: bool = False,
+    ) -> "CandidateGame":
+        """
+        Creates the candidate from the (blue, red) queue players indexes a solver returned
+        """
+        sides = ("RED", "BLUE") if swap_sides else ("BLUE", "RED")
+
+        return cls(
+            {
+                (side, roles_list[role_idx]): queue_players[qp_idx]
+                for role_idx, pair in enumerate(composition)
+                for side, qp_idx in zip(sides, pair)
+            },
+            ratings,
+        )
+
+    @property
+    def matchmaking_score(self) -> float:
+        return abs(0.5 - self.blue_expected_winrate)
+
+    @property
+    def player_ids_list(self) -> List[int]:
+        return [p.player_id for p in self.participants]
+
+    def to_game(self) -> Game:
+        """
+        Writes the composition to the database, which should only happen for the game sent to ready-check
+
+        The search ratings are only used to pick the composition, the participants' pre-game snapshot is written
+        from the ratings in the database when the game is created
+        """
+        return Game.from_players({(p.side, p.role): p.player for p in self.participants})
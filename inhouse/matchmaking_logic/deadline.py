@@ -0,0 +1,27 @@
+import time
+from typing import Optional
+
+
+class Deadline:
+    """
+    Wall-clock budget of a matchmaking search, shared by the prefix loop and the solvers
+
+    Once it expired, searches return the best composition they found so far
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.expires_at = None if budget_ms is None else time.monotonic() + budget_ms / 1000
+        self.expired = False
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+    def check(self) -> bool:
+        """
+        Returns True if the budget is spent
+        """
+        if not self.expired and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.expired = True
+
+        return self.expired
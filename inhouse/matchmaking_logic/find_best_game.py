@@ -1,14 +1,20 @@
-import itertools
 import random
-from typing import Optional, List
+from typing import Collection, Optional, List, Tuple
 
-from inhouse.models import Game, QueuePlayer
-from inhouse.common_utils.fields import roles_list
+from inhouse.models import Game
 from inhouse.game_queue import GameQueue
 from inhouse.inhouse_logger import inhouse_logger
+from inhouse.matchmaking_logic import vectorized
+from inhouse.matchmaking_logic.candidate_game import CandidateGame, Solver
+from inhouse.matchmaking_logic.deadline import Deadline
+from inhouse.matchmaking_logic.search_space import Composition, SearchSpace
+from inhouse.matchmaking_logic.telemetry import SearchStats
 
 
-def find_best_game(queue: GameQueue, game_quality_threshold=0.1) -> Optional[Game]:
+def get_search_space(queue: GameQueue) -> Optional[SearchSpace]:
+    """
+    Returns the plain-data search space of the queue, or None if there are not enough players to make a game
+    """
     # Do not do anything if there’s not at least 2 players in queue per role
 
     for role_queue in queue.queue_players_dict.values():
@@ -20,108 +26,127 @@ def find_best_game(queue: GameQueue, game_quality_threshold=0.1) -> Optional[Gam
 
     inhouse_logger.info(f"Matchmaking process started with the following queue:\n{queue}")
 
-    best_game = None
-    for players_threshold in range(10, len(queue) + 1):
+    return SearchSpace(queue.queue_players, queue.ratings)
+
+
+def search_best_composition(
+    space: SearchSpace,
+    game_quality_threshold=0.1,
+    solver: Solver = vectorized.find_best_composition,
+    excluded: Collection[int] = (),
+    deadline: Optional[Deadline] = None,
+    stats: Optional[SearchStats] = None,
+) -> Optional[Tuple[Composition, float]]:
+    """
+    Runs the solver on growing prefixes of the queue and returns the best (composition, score)
+
+    It only works on the search space and never touches the database, so it can run in a worker process
+    Queue players in excluded are not picked, which is used to pack several games
+
+    With a deadline, the search is anytime: the passes stop when it expires and the best composition so far is
+    returned. The first pass always runs so the oldest players get a game even with a tiny budget
+    The work of the solver, the best score and whether the search was cut short are counted in the stats if given
+    """
+    best_composition, best_score = None, 1
+    for players_threshold in range(10, len(space) + 1):
+        if players_threshold > 10 and deadline and deadline.check():
+            break
+
         # The queue_players are already ordered the right way to take age into account in matchmaking
         #   We first try with the 10 first players, then 11, ...
-        best_game = find_best_game_for_queue_players(queue.queue_players[:players_threshold])
+        #   Every pass after the first only looks at compositions including the newly added player,
+        #   as the others were already scored and the best one is carried over
+        options = space.role_options(
+            limit=players_threshold,
+            required=players_threshold - 1 if players_threshold > 10 else None,
+            excluded=excluded,
+            closest_mu_first=bool(deadline and deadline.bounded),
+        )
+
+        result = solver(space, options, best_score, deadline, stats)
+
+        if result:
+            best_composition, best_score = result
 
         # We stop when we beat the game quality threshold (below 60% winrate for one side)
-        if best_game and best_game.matchmaking_score < game_quality_threshold:
-            return best_game
+        if best_composition and best_score < game_quality_threshold:
+            break
 
-    return best_game
+    if stats:
+        if best_composition:
+            stats.best_score = best_score if stats.best_score is None else min(stats.best_score, best_score)
+        stats.threshold_reached |= best_score < game_quality_threshold
+        stats.exhaustive &= not (deadline and deadline.expired)
 
+    if not best_composition:
+        return None
 
-def find_best_game_for_queue_players(queue_players: List[QueuePlayer]) -> Game:
+    return best_composition, best_score
+
+
+def search_disjoint_compositions(
+    space: SearchSpace,
+    game_quality_threshold=0.1,
+    solver: Solver = vectorized.find_best_composition,
+    max_games=None,
+    budget_ms=None,
+) -> Tuple[List[Tuple[Composition, float]], SearchStats]:
     """
-    A sub function to allow us to iterate on QueuePlayers from oldest to newest
+    Packs up to max_games disjoint compositions, by default one per 10 players in queue, and returns them with
+    the stats of the search
+
+    Games are searched one after the other on the players left, so the oldest players are matched first
+    The deadline is created here and not by the caller, as the search can run in another process
     """
-    inhouse_logger.info(f"Trying to find the best game for: {' | '.join(f'{qp}' for qp in queue_players)}")
-
-    # Currently simply testing all permutations because it should be pretty lightweight
-    # TODO LOW PRIO Spot mirrored team compositions (full blue/red -> red/blue) to not calculate them twice
-
-    # This creates a list of possible 2-players permutations per role
-    # We keep it as a list to make it easier to make a product on the values afterwards
-    role_permutations = []  # list of tuples of 2-players permutations in the role
-
-    # We iterate on each role (which will have 2 players or more) and create one list of permutations per role
-    for role in roles_list:
-        role_permutations.append(
-            [
-                queue_player
-                for queue_player in itertools.permutations([qp for qp in queue_players if qp.role == role], 2)
-            ]
-        )
+    if max_games is None:
+        max_games = len(set(space.player_ids)) // 10
+
+    deadline = Deadline(budget_ms)
+    stats = SearchStats()
+
+    results = []
+    excluded = set()
+
+    while len(results) < max_games:
+        # Once the budget is spent, we keep the games already found instead of starting a new search
+        if results and deadline.check():
+            break
+
+        with stats.phase("search"):
+            result = search_best_composition(space, game_quality_threshold, solver, excluded, deadline, stats)
+
+        if not result:
+            break
+
+        results.append(result)
+
+        # Picked players cannot be part of another game in any of their roles
+        picked_player_ids = {space.player_ids[idx] for pair in result[0] for idx in pair}
+        excluded.update(idx for idx, player_id in enumerate(space.player_ids) if player_id in picked_player_ids)
+
+    if deadline.expired:
+        inhouse_logger.info(f"Matchmaking budget of {budget_ms}ms spent, keeping the best games found so far")
+
+    stats.exhaustive = not deadline.expired
+
+    return results, stats
+
+
+def game_from_composition(queue: GameQueue, result: Optional[Tuple[Composition, float]]) -> Optional[Game]:
+    """
+    Writes the (composition, score) returned by search_best_composition to the database as a Game
+    """
+    if not result:
+        return None
+
+    # Only canonical compositions are searched, so we pick the sides randomly once on the winning one
+    best_game = CandidateGame.from_composition(
+        queue.queue_players, result[0], queue.ratings, swap_sides=bool(random.getrandbits(1))
+    )
+
+    inhouse_logger.info(
+        f"Best game found with {best_game.blue_expected_winrate*100:.2f} blue side expected winrate"
+    )
 
-    # We do a very simple maximum search
-    best_score = 1
-    best_game = None
-
-    # This generates all possible team compositions
-    # The format is a list of 5 tuples with the blue and red player objects in the tuple
-    for team_composition in itertools.product(*role_permutations):
-        # We already shuffle blue/red as otherwise the first best composition is always chosen
-        shuffle = bool(random.getrandbits(1))
-
-        # bool(tuple_idx) == shuffle explanation:
-        #   tuple_idx = 0 (BLUE) &  shuffle = False -> False == False   -> True     -> BLUE
-        #   tuple_idx = 1 (RED)  &  shuffle = False -> False == True    -> False    -> RED
-        #   tuple_idx = 0 (BLUE) &  shuffle = True  -> False == True    -> False    -> RED
-        #   tuple_idx = 1 (RED)  &  shuffle = True  -> True == True     -> True     -> BLUE
-
-        # We transform it to a more manageable dictionary of QueuePlayers
-        # {(team, role)} = QueuePlayer
-        queue_players_dict = {
-            ("BLUE" if bool(tuple_idx) == shuffle else "RED", roles_list[role_idx]): queue_players_tuple[
-                tuple_idx
-            ]
-            for role_idx, queue_players_tuple in enumerate(team_composition)
-            for tuple_idx in (0, 1)
-        }
-
-        # We check that all 10 QueuePlayers are in the same team as their duos
-
-        # TODO LOW PRIO This is super stupid *but* works well enough for easy situations
-        #   This is very much in need of a rewrite
-        duos_not_in_same_team = False
-        for team_tuple, qp in queue_players_dict.items():
-            if qp.duo_id is not None:
-                try:
-                    next(
-                        duo_qp
-                        for duo_team_tuple, duo_qp in queue_players_dict.items()
-                        if duo_team_tuple[0] == team_tuple[0] and duo_qp.player_id == qp.duo_id
-                    )
-                except StopIteration:
-                    duos_not_in_same_team = True
-                    continue
-
-        if duos_not_in_same_team:
-            continue
-
-        # We take the players from the queue players and make it a new dict to create our games objects
-        players = {k: qp.player for k, qp in queue_players_dict.items()}
-
-        # We check to make sure all 10 players are different
-        if set(players.values()).__len__() != 10:
-            continue
-
-        # We create a Game object for easier handling, and it will compute the matchmaking score
-        game = Game(players)
-
-        # Importantly, we do *not* add the game to the session, as that will be handled by the bot logic itself
-
-        if game.matchmaking_score < best_score:
-            inhouse_logger.info(
-                f"New best game found with {game.blue_expected_winrate*100:.2f} blue side expected winrate"
-            )
-
-            best_game = game
-            best_score = game.matchmaking_score
-            # If the game is seen as being below 51% winrate for one side, we simply stop there (helps with big lists)
-            if best_score < 0.01:
-                break
-
-    return best_game
+    # Only the composition that goes to ready-check is written to the database
+    return best_game.to_game()
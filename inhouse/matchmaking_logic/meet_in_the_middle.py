@@ -0,0 +1,176 @@
+import bisect
+import math
+from typing import Dict, List, Optional, Tuple
+
+from inhouse.common_utils.fields import roles_list
+from inhouse.matchmaking_logic import vectorized
+from inhouse.matchmaking_logic.deadline import Deadline
+from inhouse.matchmaking_logic.search_space import Composition, CompositionConstraints, RoleOptions, SearchSpace
+from inhouse.matchmaking_logic.telemetry import SearchStats
+from inhouse.matchmaking_logic.win_probability import BETA_SQUARED, win_probability
+
+# Under this number of compositions the exhaustive numpy search is fast enough, so we fall back to it
+EXHAUSTIVE_MAX_COMPOSITIONS = 2 ** 20
+
+# Partial compositions enumerated between two checks of the deadline
+DEADLINE_CHECK_INTERVAL = 1024
+
+# (delta_mu, variance, partial composition) of the roles of one half
+HalfComposition = Tuple[float, float, Composition]
+
+
+def _split_role(sizes: List[int]) -> int:
+    """
+    Index of the first role of the second half, chosen to enumerate as few partial compositions as possible
+    """
+    return min(range(1, len(sizes)), key=lambda k: math.prod(sizes[:k]) + math.prod(sizes[k:]))
+
+
+def _enumerate_half(
+    space: SearchSpace,
+    options: RoleOptions,
+    first_role_idx: int,
+    mu: List[float],
+    variance: List[float],
+    deadline: Optional[Deadline],
+    stats: Optional[SearchStats],
+) -> List[HalfComposition]:
+    """
+    Enumerates the partial compositions of the roles of one half, stopping early once the deadline expired
+    """
+    halves = []
+
+    for part in space.constraints.compositions(options, first_role_idx, stats):
+        halves.append((sum(mu[b] - mu[r] for b, r in part), sum(variance[b] + variance[r] for b, r in part), part))
+
+        if deadline and len(halves) % DEADLINE_CHECK_INTERVAL == 0 and deadline.check():
+            break
+
+    return halves
+
+
+def _accepts(
+    constraints: CompositionConstraints,
+    first_role_idx: int,
+    part: Composition,
+    sides: Dict[int, int],
+    stats: Optional[SearchStats],
+) -> bool:
+    """
+    Checks the second half partial composition against the queue players placed by the first half
+    """
+    sides = dict(sides)
+
+    for role_idx, pair in enumerate(part, first_role_idx):
+        reason = constraints.rejection(role_idx, pair, sides)
+
+        if reason:
+            if stats:
+                stats.reject(reason)
+            return False
+
+        sides[pair[0]], sides[pair[1]] = 0, 1
+
+    return True
+
+
+def find_best_composition(
+    space: SearchSpace,
+    options: RoleOptions,
+    best_score: float = 1,
+    deadline: Optional[Deadline] = None,
+    stats: Optional[SearchStats] = None,
+) -> Optional[Tuple[Composition, float]]:
+    """
+    Meet-in-the-middle search for the composition with the most balanced expected winrate
+
+    The roles are split in two halves whose partial compositions are enumerated separately. The second half is
+    sorted by delta_mu, and for every first half we binary search the complement bringing the total delta_mu
+    closest to zero, then walk away from it until no remaining second half can beat the best composition.
+
+    Unlike the exhaustive solvers, it returns the best composition and not the first one below 51% winrate.
+    Small searches fall back to vectorized.find_best_composition. The deadline is checked while the halves are
+    enumerated and between first halves.
+    """
+    sizes = [len(role_options) for role_options in options]
+
+    if not all(sizes):
+        return None
+
+    if math.prod(sizes) <= EXHAUSTIVE_MAX_COMPOSITIONS:
+        return vectorized.find_best_composition(space, options, best_score, deadline, stats)
+
+    mu = space.mu
+    variance = [sigma * sigma for sigma in space.sigma]
+
+    split_role_idx = _split_role(sizes)
+
+    # Halves cut short by the deadline are still searched, only one first half being tried once it expired
+    first_half = _enumerate_half(space, options[:split_role_idx], 0, mu, variance, deadline, stats)
+    second_half = sorted(
+        _enumerate_half(space, options[split_role_idx:], split_role_idx, mu, variance, deadline, stats),
+        key=lambda half: half[0],
+    )
+
+    if not first_half or not second_half:
+        return None
+
+    second_half_deltas = [half[0] for half in second_half]
+    second_half_max_variance = max(half[1] for half in second_half)
+
+    players = 2 * len(roles_list)
+    base_variance = players * BETA_SQUARED
+    constraints = space.constraints
+
+    # The winrate only depends on delta_mu / sqrt(variance), so we look for the lowest absolute ratio
+    best_ratio = math.inf
+    best_composition = None
+
+    for first_delta, first_variance, first_part in first_half:
+        first_sides = {idx: side for pair in first_part for side, idx in enumerate(pair)}
+
+        # Denominator of the ratio with the highest variance the second half can add, which bounds the ratio
+        highest_denominator = math.sqrt(base_variance + first_variance + second_half_max_variance)
+
+        complement_idx = bisect.bisect_left(second_half_deltas, -first_delta)
+
+        # The absolute delta_mu only grows while walking away from the complement in either direction
+        for second_half_indexes in (
+            range(complement_idx, len(second_half)),
+            range(complement_idx - 1, -1, -1),
+        ):
+            for second_idx in second_half_indexes:
+                second_delta, second_variance, second_part = second_half[second_idx]
+
+                delta = abs(first_delta + second_delta)
+
+                if delta / highest_denominator >= best_ratio:
+                    break
+
+                ratio = delta / math.sqrt(base_variance + first_variance + second_variance)
+
+                if stats:
+                    stats.compositions_generated += 1
+                    stats.compositions_scored += 1
+
+                if ratio < best_ratio and _accepts(constraints, split_role_idx, second_part, first_sides, stats):
+                    best_ratio = ratio
+                    best_composition = first_part + second_part
+
+        if deadline and deadline.check():
+            break
+
+    if best_composition is None:
+        return None
+
+    # The delta and variance are summed in role order, like the exhaustive solvers do
+    score = abs(
+        0.5
+        - win_probability(
+            sum(mu[b] - mu[r] for b, r in best_composition),
+            sum(variance[b] + variance[r] for b, r in best_composition),
+            players,
+        )
+    )
+
+    return (best_composition, score) if score < best_score else None
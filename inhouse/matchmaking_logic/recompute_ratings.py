@@ -0,0 +1,338 @@
+import functools
+import logging
+import operator
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import trueskill
+from django.db import transaction
+from django.db.models import Q
+
+from inhouse.models import Game, GameParticipant, PlayerRating
+from inhouse.common_utils.rating_cache import rating_cache
+from inhouse.matchmaking_logic.two_team_trueskill import Rating, rate_two_teams
+
+# Rows written by a single UPDATE of bulk_update
+BULK_UPDATE_BATCH_SIZE = 1000
+
+# Ratings closer than this are not written back, as they did not change
+RATING_TOLERANCE = 1e-9
+
+
+@dataclass
+class ReplayedParticipant:
+    id: int
+    player_id: int
+    role: str
+    side: str
+    trueskill_mu: float
+    trueskill_sigma: float
+    post_trueskill_mu: Optional[float]
+    post_trueskill_sigma: Optional[float]
+
+    @property
+    def snapshot(self) -> Tuple[Optional[float], ...]:
+        return self.trueskill_mu, self.trueskill_sigma, self.post_trueskill_mu, self.post_trueskill_sigma
+
+
+@dataclass
+class ReplayedGame:
+    id: int
+    start: datetime
+    winner: str
+    participants: List[ReplayedParticipant]
+
+    @property
+    def order(self) -> Tuple[datetime, int]:
+        return self.start, self.id
+
+
+@dataclass
+class RecomputeResult:
+    games: int
+    ratings_updated: int
+    participants_updated: int
+    duration: float
+
+
+def load_scored_games(games) -> List[ReplayedGame]:
+    """
+    Loads the participants of the scored games of the queryset in start order, with a single query
+    """
+    rows = (
+        GameParticipant.objects.filter(game__in=games, game__winner__in=("BLUE", "RED"))
+        .order_by("game__server_id", "game__start", "game_id")
+        .values_list(
+            "id",
+            "game_id",
+            "game__start",
+            "game__winner",
+            "player_id",
+            "role",
+            "side",
+            "trueskill_mu",
+            "trueskill_sigma",
+            "post_trueskill_mu",
+            "post_trueskill_sigma",
+        )
+    )
+
+    replayed_games: List[ReplayedGame] = []
+
+    for participant_id, game_id, start, winner, *participant in rows.iterator():
+        if not replayed_games or replayed_games[-1].id != game_id:
+            replayed_games.append(ReplayedGame(game_id, start, winner, []))
+
+        replayed_games[-1].participants.append(ReplayedParticipant(participant_id, *participant))
+
+    return replayed_games
+
+
+def load_later_games(
+    server_id: int, after: Tuple[datetime, int], player_roles: Iterable[Tuple[int, str]]
+) -> List[ReplayedGame]:
+    """
+    Loads the scored games of the server played after the (start, id) order with one of the (player_id, role)
+    """
+    start, game_id = after
+
+    return load_scored_games(
+        Game.objects.filter(server_id=server_id)
+        .filter(Q(start__gt=start) | Q(start=start, id__gt=game_id))
+        .filter(
+            functools.reduce(
+                operator.or_,
+                (Q(participants__player_id=player_id, participants__role=role) for player_id, role in player_roles),
+            )
+        )
+    )
+
+
+def replay(games: List[ReplayedGame], ratings: Dict[Tuple[int, str], Rating]) -> List[ReplayedParticipant]:
+    """
+    Replays the games in order on the in-memory {(player_id, role)} = (mu, sigma) ratings
+
+    The pre-game and post-game snapshots of every participant are set from the ratings, and the participants whose
+    snapshots changed are returned. Missing ratings start at the trueskill defaults.
+    """
+    env = trueskill.global_env()
+    changed_participants = []
+
+    for game in games:
+        winners = [p for p in game.participants if p.side == game.winner]
+        losers = [p for p in game.participants if p.side != game.winner]
+
+        old_snapshots = [participant.snapshot for participant in game.participants]
+
+        for participant in game.participants:
+            participant.trueskill_mu, participant.trueskill_sigma = ratings.get(
+                (participant.player_id, participant.role), (env.mu, env.sigma)
+            )
+
+        new_winners, new_losers = rate_two_teams(
+            [(p.trueskill_mu, p.trueskill_sigma) for p in winners],
+            [(p.trueskill_mu, p.trueskill_sigma) for p in losers],
+        )
+
+        for participant, rating in zip(winners + losers, new_winners + new_losers):
+            ratings[participant.player_id, participant.role] = rating
+            participant.post_trueskill_mu, participant.post_trueskill_sigma = rating
+
+        changed_participants += [
+            participant
+            for participant, old_snapshot in zip(game.participants, old_snapshots)
+            if _changed(old_snapshot, participant.snapshot)
+        ]
+
+    return changed_participants
+
+
+def write_ratings(
+    ratings: Dict[Tuple[int, str], Rating],
+    participants: List[ReplayedParticipant],
+    player_ratings,
+    reset_missing: bool = False,
+) -> int:
+    """
+    Writes the changed ratings of the player_ratings queryset and the participants pre and post-game snapshots
+
+    Ratings missing from the replay are left untouched, or set back to the trueskill defaults if reset_missing.
+    Must be called inside a transaction. bulk_update does not send post_save, so the rating cache is updated once
+    the transaction is committed. Returns the number of ratings written.
+    """
+    env = trueskill.global_env()
+
+    changed_ratings = []
+    for rating_id, player_id, role, mu, sigma in player_ratings.select_for_update().order_by("id").values_list(
+        "id", "player_id", "role", "trueskill_mu", "trueskill_sigma"
+    ):
+        if (player_id, role) in ratings:
+            new_mu, new_sigma = ratings[player_id, role]
+        elif reset_missing:
+            new_mu, new_sigma = env.mu, env.sigma
+        else:
+            continue
+
+        if _changed((mu, sigma), (new_mu, new_sigma)):
+            changed_ratings.append(
+                PlayerRating(id=rating_id, player_id=player_id, role=role, trueskill_mu=new_mu, trueskill_sigma=new_sigma)
+            )
+
+    PlayerRating.objects.bulk_update(
+        changed_ratings, ["trueskill_mu", "trueskill_sigma"], batch_size=BULK_UPDATE_BATCH_SIZE
+    )
+
+    GameParticipant.objects.bulk_update(
+        [
+            GameParticipant(
+                id=p.id,
+                trueskill_mu=p.trueskill_mu,
+                trueskill_sigma=p.trueskill_sigma,
+                post_trueskill_mu=p.post_trueskill_mu,
+                post_trueskill_sigma=p.post_trueskill_sigma,
+            )
+            for p in participants
+        ],
+        ["trueskill_mu", "trueskill_sigma", "post_trueskill_mu", "post_trueskill_sigma"],
+        batch_size=BULK_UPDATE_BATCH_SIZE,
+    )
+
+    def update_cache():
+        for r in changed_ratings:
+            rating_cache.set(r.player_id, r.role, r.trueskill_mu, r.trueskill_sigma)
+
+    transaction.on_commit(update_cache)
+
+    return len(changed_ratings)
+
+
+def recompute_ratings(server_id: Optional[int] = None) -> RecomputeResult:
+    """
+    Recomputes every rating from scratch by replaying all scored games in start order, for one server or all of them
+
+    The replay runs in memory and only the ratings and pre-game snapshots that changed are written, in bulk and in
+    a single transaction, so fixing a mis-scored or deleted game does not leave ratings half updated
+    """
+    start = time.perf_counter()
+
+    games = Game.objects.all()
+    player_ratings = PlayerRating.objects.all()
+
+    if server_id is not None:
+        games = games.filter(server_id=server_id)
+        player_ratings = player_ratings.filter(player__server_id=server_id)
+
+    with transaction.atomic():
+        # Ratings are locked first so a game scored during the replay waits for it instead of being overwritten
+        #   Rows are locked in id order, like update_trueskill, so the two cannot deadlock
+        list(player_ratings.select_for_update().order_by("id").values_list("id", flat=True))
+
+        replayed_games = load_scored_games(games)
+
+        ratings: Dict[Tuple[int, str], Rating] = {}
+        changed_participants = replay(replayed_games, ratings)
+
+        # Players who only have games in a role can be missing a rating in it
+        PlayerRating.new_many(ratings)
+
+        ratings_updated = write_ratings(ratings, changed_participants, player_ratings, reset_missing=True)
+
+    result = RecomputeResult(
+        games=len(replayed_games),
+        ratings_updated=ratings_updated,
+        participants_updated=len(changed_participants),
+        duration=time.perf_counter() - start,
+    )
+
+    logging.info(
+        f"Ratings recalculados em {result.duration:.2f}s: {result.games} jogos, {result.ratings_updated} ratings "
+        f"e {result.participants_updated} participantes atualizados"
+    )
+
+    return result
+
+
+def replay_from_game(game: Game, cancel: bool = False) -> Optional[RecomputeResult]:
+    """
+    Replays the ratings from a scored game whose winner was changed, or which is cancelled if cancel is True
+
+    The participants of the game get their pre-game snapshot back, and only the later games sharing a
+    (player, role) with them are replayed, the set growing with the players of every replayed game. Other players
+    keep their snapshot, which is still right as nothing they played before was changed.
+    Returns None if the game was not scored, as it did not change any rating
+    """
+    start = time.perf_counter()
+    game_id = game.id
+
+    with transaction.atomic():
+        # Ratings of the server are locked before anything is read, so a later game scored during the replay waits
+        #   for it instead of having its rating update overwritten
+        server_ratings = PlayerRating.objects.filter(player__server_id=game.server_id)
+        list(server_ratings.select_for_update().order_by("id").values_list("id", flat=True))
+
+        edited_games = load_scored_games(Game.objects.filter(id=game.id))
+
+        if not edited_games:
+            return None
+
+        # The ratings of the affected (player, role), starting from their snapshot in the edited game
+        ratings: Dict[Tuple[int, str], Rating] = {
+            (p.player_id, p.role): (p.trueskill_mu, p.trueskill_sigma) for p in edited_games[0].participants
+        }
+
+        if cancel:
+            game.delete()
+            replayed_games = []
+        else:
+            replayed_games = edited_games
+
+        # Only the later games sharing an affected (player, role) are loaded. When a game brings new pairs in,
+        #   the games after it sharing one of them are loaded and merged with the ones still waiting
+        pending = load_later_games(game.server_id, edited_games[0].order, ratings)
+        loaded_ids = {later_game.id for later_game in pending}
+
+        while pending:
+            later_game = pending.pop(0)
+
+            # Players joining the affected set start from their snapshot, which is their rating before this game
+            new_pairs = {(p.player_id, p.role) for p in later_game.participants}.difference(ratings)
+            for p in later_game.participants:
+                ratings.setdefault((p.player_id, p.role), (p.trueskill_mu, p.trueskill_sigma))
+
+            replayed_games.append(later_game)
+
+            if new_pairs:
+                new_games = [
+                    g for g in load_later_games(game.server_id, later_game.order, new_pairs) if g.id not in loaded_ids
+                ]
+                loaded_ids.update(g.id for g in new_games)
+                pending = sorted(pending + new_games, key=lambda g: g.order)
+
+        changed_participants = replay(replayed_games, ratings)
+
+        ratings_updated = write_ratings(
+            ratings,
+            changed_participants,
+            server_ratings.filter(player_id__in={player_id for player_id, role in ratings}),
+        )
+
+    result = RecomputeResult(
+        games=len(replayed_games),
+        ratings_updated=ratings_updated,
+        participants_updated=len(changed_participants),
+        duration=time.perf_counter() - start,
+    )
+
+    logging.info(
+        f"Ratings recalculados a partir do jogo {game_id} em {result.duration * 1000:.0f}ms: {result.games} jogos, "
+        f"{result.ratings_updated} ratings e {result.participants_updated} participantes atualizados"
+    )
+
+    return result
+
+
+def _changed(old: Tuple[Optional[float], ...], new: Tuple[float, ...]) -> bool:
+    # Post-game snapshots of games scored before they were stored are missing
+    return any(a is None or abs(a - b) > RATING_TOLERANCE for a, b in zip(old, new))
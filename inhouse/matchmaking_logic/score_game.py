@@ -1,49 +1,99 @@
-import trueskill
+import functools
+import operator
 
-from inhouse.models import Game
-from inhouse.common_utils.get_last_game import get_last_game
+from django.db import transaction
+from django.db.models import Q
+
+from inhouse.models import Game, GameParticipant, PlayerRating
+from inhouse.common_utils.rating_cache import rating_cache
+from inhouse.matchmaking_logic.recompute_ratings import replay_from_game
+from inhouse.matchmaking_logic.two_team_trueskill import rate_two_teams
 
 
 def update_trueskill(game: Game):
     """
     Updates the player’s rating based on the game’s result
+
+    The ten ratings are locked and loaded with a single query and written back with a single bulk update, so it has
+    to run in the transaction setting the game’s winner. The new ratings are also saved on the participants as their
+    post-game ratings. bulk_update does not send post_save, so the rating cache
+    is set once the transaction is committed.
     """
-    blue_team_ratings = {
-        participant.player.ratings.get(role=participant.role): trueskill.Rating(
-            mu=float(participant.trueskill_mu), sigma=float(participant.trueskill_sigma)
+    participants = list(
+        game.participants.values_list("id", "player_id", "role", "side", "trueskill_mu", "trueskill_sigma")
+    )
+
+    # Ratings deleted since the game was created are created again, so all ten can be locked
+    PlayerRating.new_many({(player_id, role) for _, player_id, role, *_ in participants})
+
+    # Rows are always locked in id order, like the replays locking the whole server, so they cannot deadlock
+    player_ratings = {
+        (player_rating.player_id, player_rating.role): player_rating
+        for player_rating in PlayerRating.objects.select_for_update()
+        .filter(
+            functools.reduce(operator.or_, (Q(player_id=player_id, role=role) for _, player_id, role, *_ in participants))
         )
-        for participant in game.teams.BLUE
+        .order_by("id")
     }
 
-    red_team_ratings = {
-        participant.player.ratings.get(role=participant.role): trueskill.Rating(
-            mu=float(participant.trueskill_mu), sigma=float(participant.trueskill_sigma)
+    winners = [p for p in participants if p[3] == game.winner]
+    losers = [p for p in participants if p[3] != game.winner]
+
+    # The new ratings are computed from the pre-game values saved on the participants
+    new_winners, new_losers = rate_two_teams(
+        [(mu, sigma) for *_, mu, sigma in winners], [(mu, sigma) for *_, mu, sigma in losers]
+    )
+
+    post_game_participants = []
+
+    for (participant_id, player_id, role, *_), (mu, sigma) in zip(winners + losers, new_winners + new_losers):
+        player_rating = player_ratings[player_id, role]
+        player_rating.trueskill_mu, player_rating.trueskill_sigma = mu, sigma
+
+        post_game_participants.append(
+            GameParticipant(id=participant_id, post_trueskill_mu=mu, post_trueskill_sigma=sigma)
         )
-        for participant in game.teams.RED
-    }
 
-    if game.winner == "BLUE":
-        new_ratings = trueskill.rate([blue_team_ratings, red_team_ratings])
-    else:
-        new_ratings = trueskill.rate([red_team_ratings, blue_team_ratings])
+    PlayerRating.objects.bulk_update(player_ratings.values(), ["trueskill_mu", "trueskill_sigma"])
+    GameParticipant.objects.bulk_update(post_game_participants, ["post_trueskill_mu", "post_trueskill_sigma"])
 
-    for ratings in new_ratings:
-        for player_rating in ratings:
-            # This is the PlayerRating object
-            player_rating.trueskill_mu = ratings[player_rating].mu
-            player_rating.trueskill_sigma = ratings[player_rating].sigma
+    def update_cache():
+        for r in player_ratings.values():
+            rating_cache.set(r.player_id, r.role, r.trueskill_mu, r.trueskill_sigma)
 
-            player_rating.save()
+    transaction.on_commit(update_cache)
 
 
-def score_game_from_winning_player(player_id: int, server_id: int):
+def score_game(game: Game, winner: str) -> bool:
     """
-    Scores the last game of the player on the server as a *win*
+    Scores the game as a win for the winner side, returning False if it was already scored
     """
-    game, participant = get_last_game(player_id, server_id)
-    if game:
-        game.winner = participant.side
+    with transaction.atomic():
+        # The winner is only written if the game is not scored yet, so two !won running together cannot both
+        #   score it, the second one waiting on the row lock and then updating nothing
+        if not Game.objects.filter(id=game.id).exclude(winner__in=("BLUE", "RED")).update(winner=winner):
+            return False
+
+        game.winner = winner
         update_trueskill(game)
+
+    return True
+
+
+def change_game_winner(game: Game, winner: str):
+    """
+    Scores an already scored game for the other team, replaying the later games of its players
+    """
+    with transaction.atomic():
+        game.winner = winner
         game.save()
 
-        # Commit will happen here
+        replay_from_game(game)
+
+
+def cancel_game(game: Game):
+    """
+    Deletes the game, replaying the later games of its players if it was scored
+    """
+    if replay_from_game(game, cancel=True) is None:
+        game.delete()
@@ -0,0 +1,75 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from asgiref.sync import sync_to_async
+
+from inhouse.models import Game
+from inhouse.matchmaking_logic.score_game import cancel_game, change_game_winner, score_game
+from inhouse.repositories.executor import with_connection
+
+# Threads scoring games, each one holding a database connection
+SCORING_WORKERS = int(os.environ.get("INHOUSE_BOT_SCORING_WORKERS") or 2)
+
+
+class ScoringService:
+    """
+    Runs the database work of scoring games on a bounded thread pool, so it never blocks the event loop
+
+    The work on a given game is serialized, a correction waiting for the scoring of the same game to be done,
+    while different games are scored in parallel
+    """
+
+    def __init__(self, workers: int = SCORING_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # {game_id} = lock of the game, and the number of tasks holding or waiting for it
+        self._game_locks: Dict[int, asyncio.Lock] = {}
+        self._game_tasks: Dict[int, int] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scoring")
+
+        return self._executor
+
+    async def run(self, game_id: int, func: Callable, *args, **kwargs):
+        """
+        Runs the function in the pool once the previous work on the game is done
+        """
+        lock = self._game_locks.setdefault(game_id, asyncio.Lock())
+        self._game_tasks[game_id] = self._game_tasks.get(game_id, 0) + 1
+
+        try:
+            async with lock:
+                return await sync_to_async(with_connection(func), thread_sensitive=False, executor=self.executor)(
+                    *args, **kwargs
+                )
+
+        finally:
+            self._game_tasks[game_id] -= 1
+
+            # The lock is dropped with its last task so the map does not grow with every game ever scored
+            if not self._game_tasks[game_id]:
+                del self._game_tasks[game_id]
+                del self._game_locks[game_id]
+
+    async def score_game(self, game: Game, winner: str) -> bool:
+        return await self.run(game.id, score_game, game, winner)
+
+    async def change_game_winner(self, game: Game, winner: str):
+        return await self.run(game.id, change_game_winner, game, winner)
+
+    async def cancel_game(self, game: Game):
+        return await self.run(game.id, cancel_game, game)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+scoring_service = ScoringService()
@@ -0,0 +1,180 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+import django
+from django.db.models import prefetch_related_objects
+
+from inhouse.models import Game
+from inhouse.game_queue import GameQueue
+from inhouse.inhouse_logger import inhouse_logger
+from inhouse.matchmaking_logic import vectorized
+from inhouse.matchmaking_logic.candidate_game import Solver
+from inhouse.matchmaking_logic.deadline import Deadline
+from inhouse.matchmaking_logic.find_best_game import (
+    game_from_composition,
+    get_search_space,
+    search_best_composition,
+    search_disjoint_compositions,
+)
+from inhouse.matchmaking_logic.search_space import Composition, SearchSpace
+from inhouse.matchmaking_logic.telemetry import SearchStats, matchmaking_metrics
+from inhouse.repositories.executor import database_sync_to_async
+
+# Number of worker processes shared by the matchmaking of all channels
+MATCHMAKING_WORKERS = int(os.environ.get("INHOUSE_BOT_MATCHMAKING_WORKERS") or os.cpu_count() or 1)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Returns the process pool running the matchmaking searches, which is created once and reused by every tick
+    """
+    global _executor
+
+    if _executor is None:
+        # Workers are spawned so they do not inherit the bot threads and database connections
+        #   They only need the apps to be loaded to unpickle the search space and run the solvers
+        _executor = ProcessPoolExecutor(
+            max_workers=MATCHMAKING_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+async def run_search(search, *args):
+    """
+    Runs the search function in the process pool and awaits its result, returning None if the pool broke
+    """
+    loop = asyncio.get_running_loop()
+
+    try:
+        return await loop.run_in_executor(get_executor(), search, *args)
+
+    # A worker that died breaks the whole pool, so we drop it and a new one gets created on the next tick
+    except BrokenProcessPool as e:
+        inhouse_logger.error(f"Matchmaking worker crashed, restarting the pool: {e}")
+        shutdown_executor()
+        return None
+
+
+def search_anytime(space: SearchSpace, game_quality_threshold, solver: Solver, budget_ms):
+    """
+    search_best_composition with a deadline created in the worker, as clocks are not shared between processes
+
+    Returns the (composition, score) result and the stats of the search
+    """
+    stats = SearchStats()
+
+    with stats.phase("search"):
+        result = search_best_composition(
+            space, game_quality_threshold, solver, deadline=Deadline(budget_ms), stats=stats
+        )
+
+    return result, stats
+
+
+def create_games(queue: GameQueue, results: List[Tuple[Composition, float]]) -> List[Game]:
+    """
+    Writes the games found to the database, their participants being prefetched for the ready-check embeds
+    """
+    games = [game_from_composition(queue, result) for result in results]
+    prefetch_related_objects([game for game in games if game], "participants")
+
+    return games
+
+
+async def find_best_game_async(
+    queue: GameQueue, game_quality_threshold=0.1, solver: Solver = vectorized.find_best_composition, budget_ms=None
+) -> Optional[Game]:
+    """
+    Returns the best game for the queue, favoring players who have been in queue for the longest time
+
+    solver is one of the composition solvers: vectorized.find_best_composition, branch_and_bound.find_best_composition
+    or meet_in_the_middle.find_best_composition, which is meant for very large queues. If budget_ms is given, the
+    best game found in that time is returned. The 10 oldest players are always searched.
+
+    The search runs in the process pool and is awaited, so the event loop keeps handling heartbeats and reactions
+    during the search, and searches of different channels run in parallel on different cores
+    """
+    stats = SearchStats()
+
+    with stats.phase("search_space"):
+        space = get_search_space(queue)
+
+    if not space:
+        return None
+
+    # The pool phase is the whole round trip to the worker, the search phase being measured inside of it
+    with stats.phase("pool"):
+        output = await run_search(search_anytime, space, game_quality_threshold, solver, budget_ms)
+
+    if not output:
+        return None
+
+    result, search_stats = output
+    stats.merge(search_stats)
+
+    # Writing the game is done on the database threads like every query of the bot
+    with stats.phase("game"):
+        game = (await database_sync_to_async(create_games)(queue, [result]))[0] if result else None
+
+    matchmaking_metrics.record(queue.channel_id, stats)
+
+    return game
+
+
+async def find_best_games_async(
+    queue: GameQueue,
+    game_quality_threshold=0.1,
+    solver: Solver = vectorized.find_best_composition,
+    max_games=None,
+    budget_ms=None,
+) -> List[Game]:
+    """
+    Packing version of find_best_game_async, returning up to max_games disjoint games, by default one per 10 players
+
+    The budget_ms is shared by the searches of all games, and only bounds the search itself, not the time waiting
+    for a free worker
+    """
+    stats = SearchStats()
+
+    with stats.phase("search_space"):
+        space = get_search_space(queue)
+
+    if not space:
+        return []
+
+    # The pool phase is the whole round trip to the worker, the search phase being measured inside of it
+    with stats.phase("pool"):
+        output = await run_search(
+            search_disjoint_compositions, space, game_quality_threshold, solver, max_games, budget_ms
+        )
+
+    if not output:
+        return []
+
+    results, search_stats = output
+    stats.merge(search_stats)
+
+    # Writing the games is done on the database threads like every query of the bot
+    with stats.phase("game"):
+        games = await database_sync_to_async(create_games)(queue, results)
+
+    matchmaking_metrics.record(queue.channel_id, stats)
+
+    return games
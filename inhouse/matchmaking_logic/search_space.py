@@ -0,0 +1,208 @@
+import itertools
+from collections import defaultdict
+from typing import Collection, Dict, Iterator, List, Optional, Set, Tuple
+
+from inhouse.common_utils.fields import roles_list
+from inhouse.matchmaking_logic.telemetry import DUO, DUPLICATE, SearchStats
+
+# One (blue, red) tuple of queue player indexes per role, in roles_list order
+Composition = Tuple[Tuple[int, int], ...]
+
+# Duo index of a queue player whose duo is not part of the search, he can never be picked
+MISSING_DUO = -1
+
+# Options of a search, one list of (blue, red) pairs per role
+RoleOptions = List[List[Tuple[int, int]]]
+
+
+class SearchSpace:
+    """
+    Plain-data view of the queue players the matchmaking solvers search over
+
+    Queue players are referred to by their index in the list the space was built from
+    """
+
+    def __init__(self, queue_players: list, ratings: Dict[Tuple[int, str], Tuple[float, float]]):
+        self.player_ids = [qp.player_id for qp in queue_players]
+        self.roles = [qp.role for qp in queue_players]
+        self.mu = [float(ratings[qp.player_id, qp.role][0]) for qp in queue_players]
+        self.sigma = [float(ratings[qp.player_id, qp.role][1]) for qp in queue_players]
+
+        # duo_id is the id of the partner QueuePlayer, which we translate to his index in the space
+        queue_player_indexes = {qp.id: idx for idx, qp in enumerate(queue_players)}
+        self.duos: List[Optional[int]] = [
+            None if qp.duo_id is None else queue_player_indexes.get(qp.duo_id, MISSING_DUO)
+            for qp in queue_players
+        ]
+
+        self.constraints = CompositionConstraints(self)
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def role_indexes(self, role: str, limit: Optional[int] = None) -> List[int]:
+        """
+        Indexes of the queue players in the role, only looking at the first limit queue players if given
+        """
+        return [idx for idx, player_role in enumerate(self.roles[:limit]) if player_role == role]
+
+    def role_pairs(self, role: str, canonical: bool = False, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        All (blue, red) permutations of 2 queue players in the role
+
+        If canonical, only pairs with the oldest player on blue are returned
+        """
+        if canonical:
+            return list(itertools.combinations(self.role_indexes(role, limit), 2))
+
+        return list(itertools.permutations(self.role_indexes(role, limit), 2))
+
+    def role_options(
+        self,
+        limit: Optional[int] = None,
+        required: Optional[int] = None,
+        excluded: Collection[int] = (),
+        closest_mu_first: bool = False,
+    ) -> RoleOptions:
+        """
+        The list of (blue, red) pairs for every role, in roles_list order
+
+        A full blue/red swap has the same score, so the first role is canonical to skip mirrored compositions
+
+        Args:
+            limit: only the first limit queue players are used
+            required: only compositions including this queue player are generated
+            excluded: queue players that cannot be picked, their duos being rejected by the constraints
+            closest_mu_first: pairs of every role are sorted by mu difference instead of age, so a search cut
+                short has already gone through the most balanced compositions
+        """
+        excluded = self.constraints.excluded.union(excluded)
+
+        options = []
+
+        for role_idx, role in enumerate(roles_list):
+            pairs = [
+                pair
+                for pair in self.role_pairs(role, canonical=role_idx == 0, limit=limit)
+                if not excluded.intersection(pair)
+            ]
+
+            if required is not None and self.roles[required] == role:
+                pairs = [pair for pair in pairs if required in pair]
+
+            # The sort is stable, so pairs with the same mu difference stay in age order
+            if closest_mu_first:
+                pairs.sort(key=lambda pair: abs(self.mu[pair[0]] - self.mu[pair[1]]))
+
+            options.append(pairs)
+
+        return options
+
+
+class CompositionConstraints:
+    """
+    Duo and player-uniqueness rules of a search space, compiled once per tick into per-role index constraints
+
+    Roles are placed in roles_list order, so every rule is checked when the latest of its two roles gets placed
+    """
+
+    def __init__(self, space: SearchSpace):
+        self.role_of = role_of = [roles_list.index(role) for role in space.roles]
+
+        # Queue players that can never be picked, as their duo is not part of the search
+        self.excluded: Set[int] = set()
+
+        # Queue players of the same player in earlier roles, which cannot be picked together
+        self.conflicts: List[List[int]] = [[] for _ in space.roles]
+
+        # Duo in an earlier role, which must be on the same side
+        self.earlier_duo: List[Optional[int]] = [None for _ in space.roles]
+
+        # (queue player, duo) links with the duo in the role, the queue player being in an earlier one
+        self.later_duos: List[List[Tuple[int, int]]] = [[] for _ in roles_list]
+
+        player_indexes = defaultdict(list)
+        for idx, player_id in enumerate(space.player_ids):
+            player_indexes[player_id].append(idx)
+
+        for idx, player_id in enumerate(space.player_ids):
+            self.conflicts[idx] = [other for other in player_indexes[player_id] if role_of[other] < role_of[idx]]
+
+            duo_idx = space.duos[idx]
+            if duo_idx is None:
+                continue
+            elif duo_idx == MISSING_DUO or role_of[duo_idx] == role_of[idx]:
+                self.excluded.add(idx)
+            elif role_of[duo_idx] < role_of[idx]:
+                self.earlier_duo[idx] = duo_idx
+            else:
+                self.later_duos[role_of[duo_idx]].append((idx, duo_idx))
+
+    def accepts(self, role_idx: int, pair: Tuple[int, int], sides: Dict[int, int], first_role_idx: int = 0) -> bool:
+        """
+        Checks a (blue, red) pair against the queue players already placed in earlier roles
+
+        sides is {index} = side of the placed queue players, 0 being blue and 1 red
+        Roles before first_role_idx are not placed, so duos in those roles are not required
+        """
+        return self.rejection(role_idx, pair, sides, first_role_idx) is None
+
+    def rejection(
+        self, role_idx: int, pair: Tuple[int, int], sides: Dict[int, int], first_role_idx: int = 0
+    ) -> Optional[str]:
+        """
+        Same as accepts, but returns why the pair is rejected (telemetry.DUO or telemetry.DUPLICATE) or None
+        """
+        for side, idx in enumerate(pair):
+            for other in self.conflicts[idx]:
+                if other in sides:
+                    return DUPLICATE
+
+            duo_idx = self.earlier_duo[idx]
+            if duo_idx is not None and sides.get(duo_idx) != side and self.role_of[duo_idx] >= first_role_idx:
+                return DUO
+
+        for idx, duo_idx in self.later_duos[role_idx]:
+            side = sides.get(idx)
+            if side is not None and pair[side] != duo_idx:
+                return DUO
+
+        return None
+
+    def compositions(
+        self, options: RoleOptions, first_role_idx: int = 0, stats: Optional[SearchStats] = None
+    ) -> Iterator[Composition]:
+        """
+        Generates the valid compositions in lexicographic order, invalid branches being pruned as roles get placed
+
+        If first_role_idx is given, options only cover the roles starting from it and partial compositions are
+        generated, only checking the rules between the roles they include
+        Every pair placed and every rejection is counted in the stats if given
+        """
+        composition: List[Tuple[int, int]] = []
+        sides: Dict[int, int] = {}
+
+        def generate(role_idx: int) -> Iterator[Composition]:
+            if role_idx == first_role_idx + len(options):
+                yield tuple(composition)
+                return
+
+            for pair in options[role_idx - first_role_idx]:
+                if stats:
+                    stats.compositions_generated += 1
+
+                reason = self.rejection(role_idx, pair, sides, first_role_idx)
+                if reason:
+                    if stats:
+                        stats.reject(reason)
+                    continue
+
+                composition.append(pair)
+                sides[pair[0]], sides[pair[1]] = 0, 1
+
+                yield from generate(role_idx + 1)
+
+                composition.pop()
+                del sides[pair[0]], sides[pair[1]]
+
+        return generate(first_role_idx)
@@ -0,0 +1,107 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from typing import Dict, Optional
+
+# Reasons for which CompositionConstraints rejects a composition
+DUO = "DUO"
+DUPLICATE = "DUPLICATE"
+
+# Counters of SearchStats that are summed when merging
+COUNTERS = ("compositions_generated", "duo_rejections", "duplicate_rejections", "pruned", "compositions_scored")
+
+
+@dataclass
+class SearchStats:
+    """
+    Counters of one matchmaking tick, filled by the solvers and find_best_games_async
+
+    Tree searches count partial compositions as they place roles, so their generated compositions are not comparable
+    with the full compositions of the vectorized solver
+    """
+
+    # Compositions (or partial compositions) built by the solvers, before the duo and duplicate checks
+    compositions_generated: int = 0
+
+    # Compositions splitting a duo
+    duo_rejections: int = 0
+
+    # Compositions picking a player queuing for several roles twice
+    duplicate_rejections: int = 0
+
+    # Branches cut by a bound without being generated, only for the branch-and-bound solver
+    pruned: int = 0
+
+    # Full compositions whose expected winrate was computed
+    compositions_scored: int = 0
+
+    best_score: Optional[float] = None
+    threshold_reached: bool = False
+    exhaustive: bool = True
+
+    # {phase} = seconds spent in it during the tick
+    phases: Dict[str, float] = field(default_factory=dict)
+
+    def reject(self, reason: str):
+        if reason == DUO:
+            self.duo_rejections += 1
+        else:
+            self.duplicate_rejections += 1
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Adds the time spent in the with block to the phase
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def merge(self, other: "SearchStats"):
+        """
+        Adds the counters of a search that ran separately, for example in a worker process
+        """
+        for counter in COUNTERS:
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+
+        if other.best_score is not None and (self.best_score is None or other.best_score < self.best_score):
+            self.best_score = other.best_score
+
+        self.threshold_reached |= other.threshold_reached
+        self.exhaustive &= other.exhaustive
+
+        for name, duration in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def as_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+class MatchmakingMetrics:
+    """
+    Metrics surface of the matchmaking, keeping the last tick of every channel and the totals since the bot started
+    """
+
+    def __init__(self):
+        # {channel_id} = stats of the last tick
+        self.last_ticks: Dict[int, SearchStats] = {}
+
+        self.ticks = 0
+        self.totals = SearchStats()
+
+    def record(self, channel_id: int, stats: SearchStats):
+        self.last_ticks[channel_id] = stats
+
+        self.ticks += 1
+        self.totals.merge(stats)
+
+    def reset(self):
+        self.last_ticks.clear()
+        self.ticks = 0
+        self.totals = SearchStats()
+
+
+matchmaking_metrics = MatchmakingMetrics()
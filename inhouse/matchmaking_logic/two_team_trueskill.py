@@ -0,0 +1,68 @@
+import functools
+import math
+from typing import List, Tuple
+
+import trueskill
+
+from inhouse.matchmaking_logic.win_probability import cdf
+
+# (mu, sigma) of a player in a role
+Rating = Tuple[float, float]
+
+# Same constant and formula as the trueskill pdf, so results are the same as trueskill's
+INV_SQRT_2PI = 1 / math.sqrt(2 * math.pi)
+
+
+def pdf(x: float) -> float:
+    return INV_SQRT_2PI * math.exp(-(x ** 2 / 2))
+
+
+@functools.lru_cache()
+def _draw_margin(players: int, draw_probability: float, beta: float) -> float:
+    return trueskill.calc_draw_margin(draw_probability, players)
+
+
+def rate_two_teams(winners: List[Rating], losers: List[Rating]) -> Tuple[List[Rating], List[Rating]]:
+    """
+    Closed-form trueskill.rate for a game between two teams without draw, returning the new ratings of both
+
+    With two teams the factor graph has a single truncation, so the update can be written directly. It gives the
+    same results as trueskill.rate with the global environment, without building Rating objects or the graph.
+    """
+    env = trueskill.global_env()
+    tau_squared = env.tau * env.tau
+
+    # Variances with the dynamics factor applied
+    winners_variance = [sigma * sigma + tau_squared for mu, sigma in winners]
+    losers_variance = [sigma * sigma + tau_squared for mu, sigma in losers]
+
+    players = len(winners) + len(losers)
+
+    c = math.sqrt(sum(winners_variance) + sum(losers_variance) + players * env.beta * env.beta)
+
+    t = (sum(mu for mu, sigma in winners) - sum(mu for mu, sigma in losers)) / c
+    x = t - _draw_margin(players, env.draw_probability, env.beta) / c
+
+    denominator = cdf(x)
+    v = pdf(x) / denominator if denominator else -x
+    w = v * (v + x)
+
+    # trueskill refuses the same extreme cases, so we let it raise its own error
+    if not 0 < w < 1:
+        return _rate_with_trueskill(winners, losers)
+
+    def update(ratings: List[Rating], variances: List[float], sign: float) -> List[Rating]:
+        return [
+            (mu + sign * variance / c * v, math.sqrt(variance * (1 - variance / (c * c) * w)))
+            for (mu, sigma), variance in zip(ratings, variances)
+        ]
+
+    return update(winners, winners_variance, 1.0), update(losers, losers_variance, -1.0)
+
+
+def _rate_with_trueskill(winners: List[Rating], losers: List[Rating]) -> Tuple[List[Rating], List[Rating]]:
+    new_winners, new_losers = trueskill.rate(
+        [[trueskill.Rating(*rating) for rating in winners], [trueskill.Rating(*rating) for rating in losers]]
+    )
+
+    return [(r.mu, r.sigma) for r in new_winners], [(r.mu, r.sigma) for r in new_losers]
@@ -0,0 +1,188 @@
+import itertools
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from inhouse.common_utils.fields import roles_list
+from inhouse.matchmaking_logic.deadline import Deadline
+from inhouse.matchmaking_logic.search_space import Composition, RoleOptions, SearchSpace
+from inhouse.matchmaking_logic.telemetry import SearchStats
+from inhouse.matchmaking_logic.win_probability import win_probabilities
+
+# Validity masks of the compositions, one per couple of roles
+Masks = Dict[Tuple[int, int], np.ndarray]
+
+# Maximum number of compositions scored in a single numpy pass, which bounds the memory used by a tick
+MAX_BATCH_SIZE = 2 ** 20
+
+
+def _batches(sizes: List[int]) -> Iterator[List[np.ndarray]]:
+    """
+    Splits the product of the roles pairs in lexicographic order, yielding one index array per role
+
+    Leading roles are iterated on until the remaining product fits in MAX_BATCH_SIZE
+    """
+    remaining = math.prod(sizes)
+
+    for role_idx, size in enumerate(sizes):
+        remaining //= size
+
+        if remaining > MAX_BATCH_SIZE:
+            continue
+
+        block = max(1, MAX_BATCH_SIZE // remaining)
+
+        for leading in itertools.product(*(range(s) for s in sizes[:role_idx])):
+            for start in range(0, size, block):
+                yield (
+                    [np.array([i]) for i in leading]
+                    + [np.arange(start, min(start + block, size))]
+                    + [np.arange(s) for s in sizes[role_idx + 1 :]]
+                )
+        return
+
+
+def _broadcast(values: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Reshapes a per-role array so it broadcasts along its role axis
+    """
+    shape = [1] * len(roles_list)
+    shape[axis] = -1
+    return values.reshape(shape)
+
+
+def _broadcast_2d(values: np.ndarray, first_axis: int, second_axis: int) -> np.ndarray:
+    shape = [1] * len(roles_list)
+    shape[first_axis], shape[second_axis] = values.shape
+    return values.reshape(shape)
+
+
+def _compile_masks(space: SearchSpace, pairs: List[np.ndarray]) -> Tuple[Masks, Masks]:
+    """
+    Turns the search space constraints into validity masks, one per couple of roles
+
+    The player-uniqueness and the duo masks are returned separately so rejections can be counted by reason
+    Queue players excluded from the search are already absent from the pairs
+    """
+    constraints = space.constraints
+    role_of = {idx: roles_list.index(role) for idx, role in enumerate(space.roles)}
+
+    # For each queue player, his side in each pair of his role (0 blue, 1 red, -1 absent)
+    def sides_in(qp_idx: int) -> np.ndarray:
+        role_pairs = pairs[role_of[qp_idx]]
+        return np.where(role_pairs[:, 0] == qp_idx, 0, np.where(role_pairs[:, 1] == qp_idx, 1, -1))
+
+    duplicate_masks, duo_masks = {}, {}
+
+    def restrict(masks: Masks, first_idx: int, second_idx: int, mask: np.ndarray):
+        """
+        Combines a mask on the pairs of the roles of two queue players, the first one being in the earlier role
+        """
+        key = role_of[first_idx], role_of[second_idx]
+        masks[key] = masks[key] & mask if key in masks else mask
+
+    for idx in range(len(space)):
+        # A player queuing for two roles cannot be picked twice
+        for other in constraints.conflicts[idx]:
+            restrict(duplicate_masks, other, idx, (sides_in(other) == -1)[:, None] | (sides_in(idx) == -1)[None, :])
+
+        # A picked player needs his duo on the same side
+        duo_idx = constraints.earlier_duo[idx]
+        if duo_idx is not None:
+            qp_sides = sides_in(idx)[None, :]
+            restrict(duo_masks, duo_idx, idx, (qp_sides == -1) | (qp_sides == sides_in(duo_idx)[:, None]))
+
+    for later_duos in constraints.later_duos:
+        for idx, duo_idx in later_duos:
+            qp_sides = sides_in(idx)[:, None]
+            restrict(duo_masks, idx, duo_idx, (qp_sides == -1) | (qp_sides == sides_in(duo_idx)[None, :]))
+
+    return duplicate_masks, duo_masks
+
+
+def _apply_masks(masks: Masks, selection: List[np.ndarray], shape: Tuple[int, ...]) -> np.ndarray:
+    """
+    Validity of the compositions of a batch according to the masks
+    """
+    valid = np.ones(shape, dtype=bool)
+
+    for (first_role, second_role), mask in masks.items():
+        valid &= _broadcast_2d(mask[np.ix_(selection[first_role], selection[second_role])], first_role, second_role)
+
+    return valid
+
+
+def find_best_composition(
+    space: SearchSpace,
+    options: RoleOptions,
+    best_score: float = 1,
+    deadline: Optional[Deadline] = None,
+    stats: Optional[SearchStats] = None,
+) -> Optional[Tuple[Composition, float]]:
+    """
+    Scores the whole product of the roles pairs with numpy broadcasting and returns the best valid composition
+
+    Compositions are explored in the same order as CompositionConstraints.compositions
+    The deadline is checked between batches
+    """
+    pairs = [np.array(role_pairs, dtype=np.intp).reshape(-1, 2) for role_pairs in options]
+    sizes = [len(role_pairs) for role_pairs in pairs]
+
+    if not all(sizes):
+        return None
+
+    mu = np.array(space.mu, dtype=float)
+    sigma_squared = np.array(space.sigma, dtype=float) ** 2
+
+    # Per role contributions of each (blue, red) pair
+    delta_mu = [mu[role_pairs[:, 0]] - mu[role_pairs[:, 1]] for role_pairs in pairs]
+    variance = [sigma_squared[role_pairs[:, 0]] + sigma_squared[role_pairs[:, 1]] for role_pairs in pairs]
+
+    duplicate_masks, duo_masks = _compile_masks(space, pairs)
+
+    best_index = None
+
+    for selection in _batches(sizes):
+        batch_delta_mu = sum(_broadcast(delta_mu[r][selection[r]], r) for r in range(len(roles_list)))
+        batch_variance = sum(_broadcast(variance[r][selection[r]], r) for r in range(len(roles_list)))
+
+        scores = np.abs(0.5 - win_probabilities(batch_delta_mu, batch_variance, 2 * len(roles_list)))
+
+        no_duplicate = _apply_masks(duplicate_masks, selection, scores.shape)
+        valid = no_duplicate & _apply_masks(duo_masks, selection, scores.shape)
+
+        if stats:
+            valid_count = int(np.count_nonzero(valid))
+            duplicate_count = scores.size - int(np.count_nonzero(no_duplicate))
+
+            # Every composition of the batch is scored, but only the valid ones are candidates
+            stats.compositions_generated += scores.size
+            stats.duplicate_rejections += duplicate_count
+            stats.duo_rejections += scores.size - duplicate_count - valid_count
+            stats.compositions_scored += valid_count
+
+        scores = np.where(valid, scores, np.inf)
+
+        # Same early exit as the exhaustive search, the first game below 51% winrate is good enough
+        good_enough = np.flatnonzero(scores < 0.01)
+        batch_best = good_enough[0] if good_enough.size else int(np.argmin(scores))
+
+        if scores.flat[batch_best] < best_score:
+            best_score = float(scores.flat[batch_best])
+            best_index = [
+                int(selection[r][i]) for r, i in enumerate(np.unravel_index(batch_best, scores.shape))
+            ]
+
+            if best_score < 0.01:
+                break
+
+        if deadline and deadline.check():
+            break
+
+    if best_index is None:
+        return None
+
+    composition = tuple((int(pairs[r][i][0]), int(pairs[r][i][1])) for r, i in enumerate(best_index))
+
+    return composition, best_score
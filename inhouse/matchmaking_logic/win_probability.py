@@ -0,0 +1,97 @@
+import math
+from typing import Iterable, Tuple
+
+import numpy as np
+import trueskill
+
+# Precomputed once as every evaluation needs it, trueskill.BETA never changing at runtime
+BETA_SQUARED = trueskill.BETA * trueskill.BETA
+
+SQRT_2 = math.sqrt(2)
+
+# Coefficients of the erfc approximation used by trueskill, innermost first
+ERFC_COEFFICIENTS = (
+    0.17087277,
+    -0.82215223,
+    1.48851587,
+    -1.13520398,
+    0.27886807,
+    -0.18628806,
+    0.09678418,
+    0.37409196,
+    1.00002368,
+)
+
+
+def cdf(x: float) -> float:
+    """
+    Standard normal cdf with the erfc approximation of trueskill, so results are the same as trueskill's cdf
+
+    The polynomial is unrolled as it is much faster than a loop in pure Python
+    """
+    z = abs(x) / SQRT_2
+    t = 1.0 / (1.0 + z / 2.0)
+
+    polynomial = -0.82215223 + t * 0.17087277
+    polynomial = 1.48851587 + t * polynomial
+    polynomial = -1.13520398 + t * polynomial
+    polynomial = 0.27886807 + t * polynomial
+    polynomial = -0.18628806 + t * polynomial
+    polynomial = 0.09678418 + t * polynomial
+    polynomial = 0.37409196 + t * polynomial
+    polynomial = 1.00002368 + t * polynomial
+
+    r = t * math.exp(-z * z - 1.26551223 + t * polynomial)
+
+    # erfc(-x / sqrt(2)) is 2 - r when x is positive and r otherwise
+    return 0.5 * (2.0 - r) if x > 0 else 0.5 * r
+
+
+def cdf_array(x: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of cdf
+    """
+    z = np.abs(x) / SQRT_2
+    t = 1.0 / (1.0 + z / 2.0)
+
+    polynomial = ERFC_COEFFICIENTS[0]
+    for coefficient in ERFC_COEFFICIENTS[1:]:
+        polynomial = coefficient + t * polynomial
+
+    r = t * np.exp(-z * z - 1.26551223 + t * polynomial)
+
+    return 0.5 * np.where(x > 0, 2.0 - r, r)
+
+
+def win_probability(delta_mu: float, variance: float, players: int = 10) -> float:
+    """
+    Expected win probability of the blue team
+
+    Args:
+        delta_mu: sum of the blue mu minus sum of the red mu
+        variance: sum of the sigma squared of all players
+        players: number of players in both teams
+    """
+    return cdf(delta_mu / math.sqrt(players * BETA_SQUARED + variance))
+
+
+def win_probabilities(delta_mu: np.ndarray, variance: np.ndarray, players: int = 10) -> np.ndarray:
+    """
+    Vectorized version of win_probability
+    """
+    return cdf_array(delta_mu / np.sqrt(players * BETA_SQUARED + variance))
+
+
+def team_win_probability(blue: Iterable[Tuple[float, float]], red: Iterable[Tuple[float, float]]) -> float:
+    """
+    Expected win probability of the blue (mu, sigma) ratings over the red ones
+    """
+    delta_mu, variance, players = 0.0, 0.0, 0
+
+    for sign, ratings in ((1.0, blue), (-1.0, red)):
+        for mu, sigma in ratings:
+            delta_mu += sign * mu
+            variance += sigma * sigma
+            players += 1
+
+    return win_probability(delta_mu, variance, players)
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.4 on 2026-10-17 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inhouse', '0007_auto_20210106_0119'),
+    ]
+
+    # The columns are converted in place, Django casting every existing value to double precision
+    #   (USING "column"::double precision on PostgreSQL), so the ratings and game history are kept
+    operations = [
+        migrations.AlterField(
+            model_name='gameparticipant',
+            name='trueskill_mu',
+            field=models.FloatField(db_index=True, verbose_name='trueskill_mu'),
+        ),
+        migrations.AlterField(
+            model_name='gameparticipant',
+            name='trueskill_sigma',
+            field=models.FloatField(db_index=True, verbose_name='trueskill_sigma'),
+        ),
+        migrations.AlterField(
+            model_name='playerrating',
+            name='trueskill_mu',
+            field=models.FloatField(db_index=True, default=25, verbose_name='trueskill_mu'),
+        ),
+        migrations.AlterField(
+            model_name='playerrating',
+            name='trueskill_sigma',
+            field=models.FloatField(db_index=True, default=8.333333333333334, verbose_name='trueskill_sigma'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 3.1.4 on 2026-10-17 16:29
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_rating_history(apps, schema_editor):
+    """
+    Copies the game start on the participants and fills the post-game ratings of the scored games
+
+    The post-game rating of a participant is the pre-game rating of the next scored game of the player in the same
+    role, or his current rating for his last game
+    """
+    Game = apps.get_model('inhouse', 'Game')
+    GameParticipant = apps.get_model('inhouse', 'GameParticipant')
+    PlayerRating = apps.get_model('inhouse', 'PlayerRating')
+
+    GameParticipant.objects.update(
+        game_start=Subquery(Game.objects.filter(id=OuterRef('game_id')).values('start')[:1])
+    )
+
+    current_ratings = {
+        (player_id, role): (mu, sigma)
+        for player_id, role, mu, sigma in PlayerRating.objects.values_list(
+            'player_id', 'role', 'trueskill_mu', 'trueskill_sigma'
+        )
+    }
+
+    participants = list(
+        GameParticipant.objects.filter(game__winner__in=('BLUE', 'RED'))
+        .order_by('player_id', 'role', 'game_start', 'game_id')
+        .only('id', 'player_id', 'role', 'trueskill_mu', 'trueskill_sigma')
+    )
+
+    for participant, next_participant in zip(participants, participants[1:] + [None]):
+        if next_participant and (next_participant.player_id, next_participant.role) == (
+            participant.player_id,
+            participant.role,
+        ):
+            post_rating = next_participant.trueskill_mu, next_participant.trueskill_sigma
+        else:
+            post_rating = current_ratings.get((participant.player_id, participant.role))
+
+        if post_rating:
+            participant.post_trueskill_mu, participant.post_trueskill_sigma = post_rating
+
+    GameParticipant.objects.bulk_update(participants, ['post_trueskill_mu', 'post_trueskill_sigma'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inhouse', '0008_trueskill_float'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameparticipant',
+            name='game_start',
+            field=models.DateTimeField(null=True, verbose_name='Início do Jogo'),
+        ),
+        migrations.AddField(
+            model_name='gameparticipant',
+            name='post_trueskill_mu',
+            field=models.FloatField(blank=True, null=True, verbose_name='post_trueskill_mu'),
+        ),
+        migrations.AddField(
+            model_name='gameparticipant',
+            name='post_trueskill_sigma',
+            field=models.FloatField(blank=True, null=True, verbose_name='post_trueskill_sigma'),
+        ),
+        migrations.AddIndex(
+            model_name='gameparticipant',
+            index=models.Index(fields=['player', 'role', 'game_start'], name='inhouse_gam_player__40ac49_idx'),
+        ),
+        migrations.RunPython(backfill_rating_history, migrations.RunPython.noop),
+    ]
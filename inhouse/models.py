@@ -65,17 +65,26 @@ class Game(models.Model):
             BLUE: List[GameParticipant]
             RED: List[GameParticipant]
 
+        # participants.all() uses the prefetched participants of the games coming from the repositories
+        participants = self.participants.all()
+
         return Teams(
-            BLUE=list(self.participants.filter(side='BLUE')),
-            RED=list(self.participants.filter(side='RED')),
+            BLUE=[p for p in participants if p.side == 'BLUE'],
+            RED=[p for p in participants if p.side == 'RED'],
         )
 
     @property
     def matchmaking_score(self):
         if not self.blue_expected_winrate:
-            from inhouse.queue_channel.matchmaker import evaluate_game
+            from inhouse.matchmaking_logic.win_probability import team_win_probability
             self.start = datetime.now()
-            evaluated_game = evaluate_game(self)
+
+            # A single query for the ratings of both teams, which are evaluated as floats
+            ratings = {'BLUE': [], 'RED': []}
+            for side, mu, sigma in self.participants.values_list('side', 'trueskill_mu', 'trueskill_sigma'):
+                ratings[side].append((mu, sigma))
+
+            evaluated_game = team_win_probability(ratings['BLUE'], ratings['RED'])
             logging.info(f'Game avaliado com o rating {evaluated_game}')
             self.blue_expected_winrate = evaluated_game
         return abs(0.5 - float(self.blue_expected_winrate))
@@ -139,19 +148,43 @@ class Game(models.Model):
 
     @classmethod
     def from_players(cls, players):
+        """
+        Creates the game and its participants from a {(side, role)} = Player dictionary
+
+        The participants' pre-game ratings are the current PlayerRating rows, read with a single query and never
+        from the in-process rating cache, which other processes writing ratings do not invalidate
+        """
+        from inhouse.common_utils.rating_cache import rating_cache
+
+        player_roles = {(v.id, role) for (side, role), v in players.items()}
+
+        ratings = {
+            (player_id, role): (mu, sigma)
+            for player_id, role, mu, sigma in PlayerRating.objects.filter(
+                player_id__in={player_id for player_id, role in player_roles}
+            ).values_list("player_id", "role", "trueskill_mu", "trueskill_sigma")
+            if (player_id, role) in player_roles
+        }
+
+        # The cache used by the matchmaking is refreshed with the stored ratings
+        for (player_id, role), (mu, sigma) in ratings.items():
+            rating_cache.set(player_id, role, mu, sigma)
+
+        PlayerRating.new_many(player_roles.difference(ratings))
+
         g = cls()
         g.start = datetime.now()
         saved = False
+        team_ratings = {'BLUE': [], 'RED': []}
         for k,v in players.items():
             if not saved:
-                g.server = v.server
+                g.server_id = v.server_id
                 g.save()
+                saved = True
             side = k[0]
             role = k[1]
-            try:
-                player_mmr = v.ratings.get(role=role)
-            except:
-                player_mmr = PlayerRating.new(v, role)
+            # Ratings created above have the default values
+            trueskill_mu, trueskill_sigma = ratings.get((v.id, role), (25, 25/3))
 
             gp = GameParticipant()
             gp.game = g
@@ -159,13 +192,15 @@ class Game(models.Model):
             gp.side = side
             gp.role = role
             gp.name = v.name
-            gp.trueskill_mu = player_mmr.trueskill_mu
-            gp.trueskill_sigma = player_mmr.trueskill_sigma
+            gp.trueskill_mu = trueskill_mu
+            gp.trueskill_sigma = trueskill_sigma
+            gp.game_start = g.start
             gp.save()
+            team_ratings[side].append((trueskill_mu, trueskill_sigma))
 
-        from inhouse.queue_channel.matchmaker import evaluate_game
-        g.start = datetime.now()
-        evaluated_game = evaluate_game(g)
+        # The ratings are evaluated as they were written, without reading the participants back
+        from inhouse.matchmaking_logic.win_probability import team_win_probability
+        evaluated_game = team_win_probability(team_ratings['BLUE'], team_ratings['RED'])
         logging.info(f'Game avaliado com o rating {evaluated_game}')
         g.blue_expected_winrate = evaluated_game
         g.save()
@@ -197,18 +232,32 @@ class GameParticipant(models.Model):
     name = models.CharField('Nome do Jogador', max_length=200)
 
     # Pre-game TrueSkill values
-    trueskill_mu = models.DecimalField('trueskill_mu', decimal_places=4,max_digits=6, db_index=True)
-    trueskill_sigma = models.DecimalField('trueskill_sigma', decimal_places=4,max_digits=6, db_index=True)
+    trueskill_mu = models.FloatField('trueskill_mu', db_index=True)
+    trueskill_sigma = models.FloatField('trueskill_sigma', db_index=True)
+
+    # Post-game TrueSkill values, set when the game is scored
+    post_trueskill_mu = models.FloatField('post_trueskill_mu', null=True, blank=True)
+    post_trueskill_sigma = models.FloatField('post_trueskill_sigma', null=True, blank=True)
+
+    # Copy of the game start, so the rating history of a player is a single range scan of the index
+    game_start = models.DateTimeField('Início do Jogo', null=True)
 
     # Conservative rating for MMR display
     @property
     def mmr(self):
         return 20 * (self.trueskill_mu - 3 * self.trueskill_sigma + 25)
 
+    @property
+    def post_mmr(self):
+        return 20 * (self.post_trueskill_mu - 3 * self.post_trueskill_sigma + 25)
+
     @property
     def short_name(self):
         return self.name[:15]
 
+    class Meta:
+        indexes = [models.Index(fields=['player', 'role', 'game_start'])]
+
 
 class Player(models.Model):
     id = models.BigAutoField(primary_key=True)
@@ -276,8 +325,8 @@ class PlayerRating(models.Model):
 
     player = models.ForeignKey('Player', on_delete=models.CASCADE, related_name='ratings')
     role = models.CharField('Role', max_length=4, choices=[(role,role) for role in roles_list], db_index=True)
-    trueskill_mu = models.DecimalField('trueskill_mu', default=25, decimal_places=4,max_digits=6, db_index=True)
-    trueskill_sigma = models.DecimalField('trueskill_sigma', default=25/3, decimal_places=4,max_digits=6, db_index=True)
+    trueskill_mu = models.FloatField('trueskill_mu', default=25, db_index=True)
+    trueskill_sigma = models.FloatField('trueskill_sigma', default=25/3, db_index=True)
     
     @property
     def wins(self):
@@ -306,6 +355,21 @@ class PlayerRating(models.Model):
         r.save()
         return r
 
+    @classmethod
+    def new_many(cls, player_roles):
+        """
+        Creates the default ratings of the (player_id, role) pairs in a single query
+
+        Pairs that already have a rating are left untouched
+        """
+        cls.objects.bulk_create(
+            [
+                cls(player_id=player_id, role=role, trueskill_mu=25, trueskill_sigma=25/3)
+                for player_id, role in player_roles
+            ],
+            ignore_conflicts=True,
+        )
+
     def __repr__(self):
         return f"<PlayerRating: player_id={self.player_id} role={self.role}>"
 
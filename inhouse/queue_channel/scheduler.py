@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from inhouse.queue_channel.matchmaker import MatchMaker
+
+# Seconds waited after a queue change before searching, so a burst of changes only triggers one search
+MATCHMAKING_DEBOUNCE = 0.5
+
+# Maximum number of channels searched at the same time
+MATCHMAKING_CONCURRENCY = int(os.environ.get("INHOUSE_BOT_MATCHMAKING_CONCURRENCY") or 4)
+
+# Run states of a channel
+IDLE = "IDLE"
+SCHEDULED = "SCHEDULED"
+SEARCHING = "SEARCHING"
+READY_CHECK = "READY_CHECK"
+
+
+@dataclass
+class ChannelState:
+    matchmaker: MatchMaker
+    state: str = IDLE
+
+    # The queue changed while the channel was searching or in ready-check, it will be searched again afterwards
+    triggered: bool = False
+
+    debounce_handle: Optional[asyncio.TimerHandle] = None
+
+
+class MatchmakingScheduler:
+    """
+    Runs the matchmaking of every queue channel with a fixed number of workers
+
+    Triggered channels wait in a single FIFO and are never in it twice, which gives a fair round-robin between
+    channels. Ready-checks run outside of the workers so a long ready-check does not hold a search slot.
+    """
+
+    def __init__(self, bot, concurrency: int = MATCHMAKING_CONCURRENCY):
+        self.bot = bot
+        self.concurrency = concurrency
+
+        self.channels: Dict[int, ChannelState] = {}
+
+        self._ready_channels: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        """
+        Starts the workers, only once
+        """
+        if self._workers:
+            return
+
+        logging.info(f'Iniciando o agendador de matchmaking com {self.concurrency} workers')
+
+        self._ready_channels = asyncio.Queue()
+        self._workers = [self.bot.loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+        # Channels added before the start might already have players in queue
+        for channel_id in self.channels:
+            self.trigger(channel_id)
+
+    def add_channel(self, channel_id: int, manager):
+        """
+        Adds a queue channel to the scheduler, doing nothing if it is already there
+        """
+        if channel_id in self.channels:
+            return
+
+        logging.info(f'Adicionando o canal {channel_id} ao matchmaking')
+        self.channels[channel_id] = ChannelState(MatchMaker(channel_id, manager))
+
+        # Players might already be in queue, so we search once
+        self.trigger(channel_id)
+
+    def remove_channel(self, channel_id: int):
+        logging.info(f'Removendo o canal {channel_id} do matchmaking')
+        channel = self.channels.pop(channel_id, None)
+
+        if channel and channel.debounce_handle:
+            channel.debounce_handle.cancel()
+
+    def trigger(self, channel_id: int):
+        """
+        Schedules the matchmaking of the channel, called whenever its queue changes
+
+        Can be called from any thread, as Django signals are not always sent from the event loop
+        """
+        self.bot.loop.call_soon_threadsafe(self._debounce, channel_id)
+
+    def _debounce(self, channel_id: int):
+        channel = self.channels.get(channel_id)
+
+        if not channel or not self._workers:
+            return
+
+        # Every trigger restarts the delay, which coalesces bursts of queue changes
+        if channel.debounce_handle:
+            channel.debounce_handle.cancel()
+
+        channel.debounce_handle = self.bot.loop.call_later(MATCHMAKING_DEBOUNCE, self._schedule, channel_id)
+
+    def _schedule(self, channel_id: int):
+        channel = self.channels.get(channel_id)
+
+        if not channel:
+            return
+
+        channel.debounce_handle = None
+
+        if channel.state == IDLE:
+            channel.state = SCHEDULED
+            self._ready_channels.put_nowait(channel_id)
+
+        elif channel.state in (SEARCHING, READY_CHECK):
+            channel.triggered = True
+
+    def _finish(self, channel_id: int, channel: ChannelState):
+        # The channel might have been removed, or removed and added again, during the run
+        if self.channels.get(channel_id) is not channel:
+            return
+
+        channel.state = IDLE
+
+        if channel.triggered:
+            channel.triggered = False
+            self._schedule(channel_id)
+
+    async def _worker(self):
+        while True:
+            channel_id = await self._ready_channels.get()
+            channel = self.channels.get(channel_id)
+
+            # The channel was removed while waiting, or removed and added again which queued it twice
+            if not channel or channel.state != SCHEDULED:
+                continue
+
+            channel.state = SEARCHING
+
+            try:
+                games = await channel.matchmaker.find_games()
+
+            # We catch every error here so the worker and the channel keep running
+            except Exception as e:
+                logging.exception(f'Erro no matchmaking do canal {channel_id}: {e}')
+                games = []
+
+            if not games:
+                self._finish(channel_id, channel)
+                continue
+
+            # The players are in ready-check, so the channel is not searched until it is over
+            channel.state = READY_CHECK
+            self.bot.loop.create_task(self._run_ready_checks(channel_id, channel, games))
+
+    async def _run_ready_checks(self, channel_id: int, channel: ChannelState, games):
+        try:
+            await channel.matchmaker.run_ready_checks(games)
+
+        except Exception as e:
+            logging.exception(f'Erro na checagem do canal {channel_id}: {e}')
+
+        self._finish(channel_id, channel)
@@ -12,6 +12,7 @@ from inhouse.models import (
     Game,
     GameParticipant,
 )
+from inhouse import repositories
 from inhouse.stats_menus.ranking_pages import RankingPagesSource
 
 
@@ -27,20 +28,17 @@ class RankingChannelHandler:
     def get_server_ranking_channels(self, server_id: int) -> List[int]:
         return [c.id for c in self._ranking_channels if c.server_id == server_id]
 
-    def mark_ranking_channel(self, channel_id, server_id):
+    async def mark_ranking_channel(self, channel_id, server_id):
         """
-        Marks the given channel + server combo as a queue
+        Marks the given channel + server combo as a ranking channel
         """
-        try:
-            channel = ChannelInformation(id=channel_id, server_id=server_id, channel_type="RANKING")
-        except models.IntegrityError:
-            pass
+        channel = await repositories.channels.mark(channel_id, server_id, "RANKING")
 
         self._ranking_channels.append(channel)
 
-    def unmark_ranking_channel(self, channel_id):
+    async def unmark_ranking_channel(self, channel_id):
 
-        channel_query = ChannelInformation.objects.filter(id=channel_id).delete()
+        await repositories.channels.unmark(channel_id, "RANKING")
 
         self._ranking_channels = [c for c in self._ranking_channels if c.id != channel_id]
 
@@ -54,13 +52,13 @@ class RankingChannelHandler:
             channel = bot.get_channel(channel_id)
 
             if not channel:  # Happens when the channel does not exist anymore
-                self.unmark_ranking_channel(channel_id)  # We remove it for the future
+                await self.unmark_ranking_channel(channel_id)  # We remove it for the future
                 continue
 
             await self.refresh_channel_rankings(channel=channel)
 
     async def refresh_channel_rankings(self, channel: TextChannel):
-        ratings = self.get_server_ratings(channel.guild.id, limit=30)
+        ratings = await repositories.player_ratings.get_server_ranking(channel.guild.id, limit=30)
 
         # We need 3 messages because of character limits
         source = RankingPagesSource(ratings, embed_name_suffix=f"on {channel.guild.name}")
@@ -76,17 +74,5 @@ class RankingChannelHandler:
         # Finally, we do that just in case
         await channel.purge(check=lambda msg: msg.id not in new_msgs_ids)
 
-    @staticmethod
-    def get_server_ratings(server_id: int, role: str = None, limit=100):
-
-        retings = PlayerRating.objects.filter(player__server_id=server_id)
-
-        if role:
-            ratings = ratings.filter(role=role)
-
-        ratings = ratings[:limit].all()
-
-        return ratings
-
 
 ranking_channel_handler = RankingChannelHandler()
@@ -0,0 +1,2 @@
+from inhouse.repositories.executor import database_sync_to_async, get_executor, shutdown_executor
+from inhouse.repositories import channels, game_participants, games, player_ratings, queue_players
@@ -0,0 +1,35 @@
+from typing import List, Optional
+
+from inhouse.models import ChannelInformation
+from inhouse.repositories.executor import database_sync_to_async
+
+
+@database_sync_to_async
+def get_channels(channel_type: str) -> List[ChannelInformation]:
+    return list(ChannelInformation.objects.filter(channel_type=channel_type))
+
+
+@database_sync_to_async
+def mark(channel_id: int, server_id: int, channel_type: str) -> ChannelInformation:
+    """
+    Marks the channel as a QUEUE or RANKING channel of the server
+    """
+    channel = ChannelInformation(id=channel_id, server_id=server_id, channel_type=channel_type)
+    channel.save()
+
+    return channel
+
+
+@database_sync_to_async
+def unmark(channel_id: int, channel_type: Optional[str] = None) -> bool:
+    """
+    Reverts the channel to a normal channel, returning False if it was not marked
+    """
+    channels = ChannelInformation.objects.filter(id=channel_id)
+
+    if channel_type:
+        channels = channels.filter(channel_type=channel_type)
+
+    deleted, _ = channels.delete()
+
+    return bool(deleted)
@@ -0,0 +1,67 @@
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+# Threads running the database queries of the bot, each one holding a database connection
+DATABASE_WORKERS = int(os.environ.get("INHOUSE_BOT_DATABASE_WORKERS") or 4)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool running the queries, which is created once and shared by the whole bot
+    """
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DATABASE_WORKERS, thread_name_prefix="database")
+
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def with_connection(func: Callable) -> Callable:
+    """
+    Wraps the function to drop the stale database connections of the worker thread around it
+
+    Pool threads are reused for a long time, so their connections have to be closed like a request would
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return wrapper
+
+
+def database_sync_to_async(func: Callable) -> Callable:
+    """
+    Turns a function using the ORM into a coroutine function running on the database threads
+
+    A slow query then only delays the coroutine awaiting it, and never the event loop
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await sync_to_async(with_connection(func), thread_sensitive=False, executor=get_executor())(
+            *args, **kwargs
+        )
+
+    return wrapper
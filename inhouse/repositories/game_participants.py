@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from inhouse.models import Game, GameParticipant
+from inhouse.common_utils.get_last_game import get_last_game
+from inhouse.repositories.executor import database_sync_to_async
+
+
+@database_sync_to_async
+def get_history(player_id: int, server_id: Optional[int] = None, limit: int = 20) -> List[Tuple[Game, GameParticipant]]:
+    """
+    Returns the (game, participant) of the games of the player, on the server if given
+    """
+    participants = GameParticipant.objects.filter(player_id=player_id).select_related('game').order_by('game__start')
+
+    if server_id:
+        participants = participants.filter(game__server_id=server_id)
+
+    return [(participant.game, participant) for participant in participants[:limit]]
+
+
+@database_sync_to_async
+def set_champion(player_id: int, server_id: int, champion_id: int, game_id: Optional[int] = None) -> Optional[int]:
+    """
+    Saves the champion of the player in the game, his last game on the server by default
+
+    Returns the id of the game, or None if the player did not play it
+    """
+    if game_id is None:
+        game, participant = get_last_game(player_id=player_id, server_id=server_id)
+    else:
+        participant = GameParticipant.objects.filter(game_id=game_id, player_id=player_id).first()
+
+    if not participant:
+        return None
+
+    participant.champion_id = champion_id
+    participant.save(update_fields=['champion_id'])
+
+    return participant.game_id
+
+
+@database_sync_to_async
+def get_rating_history(player_id: int, days: Optional[int] = None) -> List[GameParticipant]:
+    """
+    Returns the scored participants of the player with their post-game ratings, over the last days if given
+
+    The post-game ratings are saved on the participants, so the history is a single range scan of the
+    (player, role, game_start) index whatever the period
+    """
+    participants = GameParticipant.objects.filter(player_id=player_id, post_trueskill_mu__isnull=False)
+
+    if days:
+        participants = participants.filter(game_start__gt=datetime.now() - timedelta(days=days))
+
+    return list(
+        participants.order_by('role', 'game_start').only(
+            'role', 'game_start', 'post_trueskill_mu', 'post_trueskill_sigma'
+        )
+    )
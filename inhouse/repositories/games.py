@@ -0,0 +1,25 @@
+from typing import Optional
+
+from inhouse.models import Game
+from inhouse.common_utils.get_last_game import get_last_game as _get_last_game
+from inhouse.repositories.executor import database_sync_to_async
+
+get_last_game = database_sync_to_async(_get_last_game)
+
+
+@database_sync_to_async
+def get(game_id: int) -> Optional[Game]:
+    """
+    Returns the game with its participants prefetched, or None if it does not exist
+    """
+    return Game.objects.filter(id=game_id).prefetch_related('participants').first()
+
+
+@database_sync_to_async
+def save(game: Game):
+    game.save()
+
+
+@database_sync_to_async
+def delete(game: Game):
+    game.delete()
@@ -0,0 +1,58 @@
+from typing import List, Optional, Tuple
+
+from django.db.models import Count, F, Func, Q
+
+from inhouse.models import PlayerRating, roles_list
+from inhouse.common_utils.rating_cache import rating_cache
+from inhouse.repositories.executor import database_sync_to_async
+
+load_cache = database_sync_to_async(rating_cache.load)
+
+
+def _with_counts(ratings):
+    """
+    Selects the player of the ratings and annotates them with their game_count and win_count in the role
+    """
+    return ratings.select_related('player').annotate(
+        game_count=Count('player__games', filter=Q(player__games__role=F('role'))),
+        win_count=Count(
+            'player__games',
+            filter=Q(player__games__role=F('role'), player__games__side=F('player__games__game__winner')),
+        ),
+    )
+
+
+@database_sync_to_async
+def get_server_ranking(server_id: int, role: Optional[str] = None, limit: int = 100) -> List[PlayerRating]:
+    """
+    Returns the best ratings of the server with their counts, for a single role if given
+    """
+    ratings = PlayerRating.objects.filter(player__server_id=server_id)
+
+    if role:
+        ratings = ratings.filter(role=role)
+
+    # Same order as the mmr, which is increasing with mu - 3 sigma
+    ratings = _with_counts(ratings).order_by((F('trueskill_mu') - 3 * F('trueskill_sigma')).desc())
+
+    return list(ratings[:limit])
+
+
+@database_sync_to_async
+def get_player_stats(player_id: int, server_id: Optional[int] = None) -> List[Tuple[PlayerRating, int]]:
+    """
+    Returns the (rating, rank) of the player in every role he has a rating in, on the server if given
+    """
+    ratings = PlayerRating.objects.filter(player_id=player_id)
+
+    if server_id:
+        ratings = ratings.filter(player__server_id=server_id)
+
+    ratings = sorted(_with_counts(ratings), key=lambda rating: roles_list.index(rating.role))
+
+    ranked_ratings = PlayerRating.objects.annotate(mmr=Func(F('trueskill_mu'), F('trueskill_sigma'), function='mmr'))
+
+    return [
+        (rating, ranked_ratings.filter(mmr__gt=rating.mmr).exclude(player_id=player_id).count())
+        for rating in ratings
+    ]
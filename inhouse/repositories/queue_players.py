@@ -0,0 +1,23 @@
+from inhouse.game_queue import GameQueue, queue_handler
+from inhouse.repositories.executor import database_sync_to_async
+
+add_player = database_sync_to_async(queue_handler.add_player)
+add_duo = database_sync_to_async(queue_handler.add_duo)
+remove_player = database_sync_to_async(queue_handler.remove_player)
+reset_queue = database_sync_to_async(queue_handler.reset_queue)
+
+start_ready_check = database_sync_to_async(queue_handler.start_ready_check)
+validate_ready_check = database_sync_to_async(queue_handler.validate_ready_check)
+cancel_ready_check = database_sync_to_async(queue_handler.cancel_ready_check)
+cancel_all_ready_checks = database_sync_to_async(queue_handler.cancel_all_ready_checks)
+
+load_ratings = database_sync_to_async(GameQueue.load_ratings)
+
+
+@database_sync_to_async
+def load_queue(channel_id: int) -> GameQueue:
+    """
+    Loads the queue of the channel with its players and ratings
+    """
+    return GameQueue(channel_id)
+
@@ -8,6 +8,7 @@ from discord.ext import commands
 from discord.ext.commands import NoPrivateMessage
 
 from inhouse import game_queue
+from inhouse import repositories
 from inhouse.common_utils.constants import PREFIX
 from inhouse.common_utils.game_channels_manager import GameChannelManager
 
@@ -65,7 +66,8 @@ class InhouseBot(commands.Bot):
     async def on_ready(self):
         self.logger.info(f"{self.user.name} has connected to Discord")
 
-        game_queue.cancel_all_ready_checks()
+        await repositories.queue_players.cancel_all_ready_checks()
+        await repositories.player_ratings.load_cache()
         self.game_channels_manager.fire_ready()
         await ranking_channel_handler.update_ranking_channels(bot=self, server_id=None)
 
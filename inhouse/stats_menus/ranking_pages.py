@@ -26,7 +26,7 @@ class RankingPagesSource(menus.ListPageSource):
 
         rows = []
 
-        max_name_length = max(len(r.Player.short_name) for r in entries)
+        max_name_length = max(len(r.player.short_name) for r in entries)
 
         for idx, row in enumerate(entries):
             rank = idx + offset
@@ -35,16 +35,17 @@ class RankingPagesSource(menus.ListPageSource):
 
             role = get_role_emoji(row.role)
 
-            player_name = row.Player.short_name
+            player_name = row.player.short_name
 
             player_padding = max_name_length - len(player_name) + 2
 
-            wins = row.wins.count()
-            losses = row.count - wins
+            # The counts are annotated by the repository, so formatting a page does not query
+            wins = row.win_count
+            losses = row.game_count - wins
 
             output_string = (
                 f"{rank_str}{role}  "
-                f"`{row.Player.short_name}{' '*player_padding}{int(row.mmr)} "
+                f"`{row.player.short_name}{' '*player_padding}{int(row.mmr)} "
                 f"{wins}W {losses}L`"
             )
 
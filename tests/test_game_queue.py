@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from inhouse.game_queue import GameQueue, queue_handler
+from inhouse.models import ChannelInformation, Player, QueuePlayer, Server, roles_list
+
+
+@override_settings(USE_TZ=True, TIME_ZONE='America/Fortaleza')
+class GameQueueTestCase(TestCase):
+    def setUp(self):
+        server = Server.objects.create(id=1)
+        self.channel = ChannelInformation.objects.create(id=10, server=server, channel_type='QUEUE')
+
+        self.players = [Player.objects.create(id=100 + i, server=server, name=f'player {i}') for i in range(10)]
+
+        for i, player in enumerate(self.players):
+            QueuePlayer.objects.create(
+                channel=self.channel,
+                player=player,
+                role=roles_list[i % 5],
+                queue_time=timezone.now() - timedelta(minutes=10 - i),
+            )
+
+        queue_handler.add_duo(
+            100, 'TOP', 101, 'JGL', channel_id=self.channel.id, server_id=1,
+            first_player_name='player 0', second_player_name='player 1',
+        )
+
+        self.queue = GameQueue(self.channel.id)
+
+    def test_removing_a_duo_partner_clears_the_duo(self):
+        partner = QueuePlayer.objects.get(player_id=101)
+        self.queue.remove(partner)
+
+        queue_player = next(qp for qp in self.queue.queue_players if qp.player_id == 100)
+
+        self.assertIsNone(queue_player.duo_id)
+        self.assertEqual(self.queue.duos, [])
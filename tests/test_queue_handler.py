@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from inhouse.game_queue import queue_handler
+from inhouse.models import ChannelInformation, Player, QueuePlayer, Server, roles_list
+
+
+class ValidateReadyCheckTestCase(TestCase):
+    def setUp(self):
+        server = Server.objects.create(id=1)
+        self.channel = ChannelInformation.objects.create(id=10, server=server, channel_type='QUEUE')
+        self.other_channel = ChannelInformation.objects.create(id=11, server=server, channel_type='QUEUE')
+
+        # Two players per role in the game, and two more waiting in the queue
+        self.players = [Player.objects.create(id=100 + i, server=server, name=f'player {i}') for i in range(12)]
+
+        for i, player in enumerate(self.players):
+            QueuePlayer.objects.create(channel=self.channel, player=player, role=roles_list[i % 5])
+
+        # A player of the game also queued in another channel
+        QueuePlayer.objects.create(channel=self.other_channel, player=self.players[0], role='MID')
+
+        self.game_player_ids = [player.id for player in self.players[:10]]
+
+        queue_handler.start_ready_check(
+            player_ids=self.game_player_ids, channel_id=self.channel.id, ready_check_message_id=1000
+        )
+
+    def test_validate_ready_check_drops_the_players_from_all_queues(self):
+        queue_handler.validate_ready_check(1000)
+
+        self.assertFalse(QueuePlayer.objects.filter(player_id__in=self.game_player_ids).exists())
+
+    def test_validate_ready_check_keeps_the_other_players(self):
+        queue_handler.validate_ready_check(1000)
+
+        self.assertEqual(
+            set(QueuePlayer.objects.values_list('player_id', flat=True)), {self.players[10].id, self.players[11].id}
+        )
+
+    def test_validate_other_ready_check(self):
+        queue_handler.validate_ready_check(2000)
+
+        self.assertEqual(QueuePlayer.objects.filter(ready_check_id=1000).count(), 10)
@@ -0,0 +1,62 @@
+import random
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from inhouse.matchmaking_logic.recompute_ratings import recompute_ratings
+from inhouse.matchmaking_logic.score_game import cancel_game, change_game_winner, score_game
+from inhouse.models import Game, GameParticipant, Player, PlayerRating, Server, roles_list
+
+
+class ReplayFromGameTestCase(TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        server = Server.objects.create(id=1)
+        players = [Player.objects.create(id=100 + i, server=server, name=f'player {i}') for i in range(20)]
+
+        self.games = []
+        for n in range(40):
+            game_players = rng.sample(players, 10)
+            game = Game.objects.create(server=server, start=datetime(2021, 1, 1) + timedelta(hours=n))
+
+            for i, player in enumerate(game_players):
+                role = roles_list[i % 5]
+                rating, _ = PlayerRating.objects.get_or_create(player=player, role=role)
+                GameParticipant.objects.create(
+                    game=game,
+                    player=player,
+                    side='BLUE' if i < 5 else 'RED',
+                    role=role,
+                    name=player.name,
+                    trueskill_mu=rating.trueskill_mu,
+                    trueskill_sigma=rating.trueskill_sigma,
+                )
+
+            score_game(game, rng.choice(['BLUE', 'RED']))
+            self.games.append(game)
+
+    def ratings(self):
+        return {(r.player_id, r.role): (r.trueskill_mu, r.trueskill_sigma) for r in PlayerRating.objects.all()}
+
+    def assertMatchesFullRecompute(self):
+        ratings = self.ratings()
+        result = recompute_ratings(server_id=1)
+
+        self.assertEqual(result.participants_updated, 0)
+        self.assertEqual(result.ratings_updated, 0)
+
+        for key, (mu, sigma) in self.ratings().items():
+            self.assertAlmostEqual(ratings[key][0], mu, delta=1e-9)
+            self.assertAlmostEqual(ratings[key][1], sigma, delta=1e-9)
+
+    def test_change_game_winner_matches_full_recompute(self):
+        game = Game.objects.get(id=self.games[10].id)
+        change_game_winner(game, 'RED' if game.winner == 'BLUE' else 'BLUE')
+
+        self.assertMatchesFullRecompute()
+
+    def test_cancel_game_matches_full_recompute(self):
+        cancel_game(Game.objects.get(id=self.games[25].id))
+
+        self.assertFalse(Game.objects.filter(id=self.games[25].id).exists())
+        self.assertMatchesFullRecompute()
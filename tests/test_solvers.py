@@ -0,0 +1,40 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from inhouse.matchmaking_logic import branch_and_bound, meet_in_the_middle, vectorized
+from inhouse.matchmaking_logic.benchmark import synthetic_queue
+from inhouse.matchmaking_logic.search_space import SearchSpace
+
+
+class SolversTestCase(SimpleTestCase):
+    def assertSameResult(self, result, expected):
+        if expected is None:
+            self.assertIsNone(result)
+            return
+
+        self.assertIsNotNone(result)
+        self.assertEqual(result[0], expected[0])
+        self.assertAlmostEqual(result[1], expected[1], delta=1e-12)
+
+    def test_solvers_match_vectorized(self):
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                # The wide rating spread keeps most searches above the early exit, so they are exhaustive
+                queue = synthetic_queue(seed, 3, rating_spread=20.0)
+                space = SearchSpace(queue.queue_players, queue.ratings)
+                options = space.role_options()
+
+                expected = vectorized.find_best_composition(space, options, 1)
+
+                # Meet-in-the-middle falls back to vectorized on queues this small, so the fallback is disabled
+                with mock.patch.object(meet_in_the_middle, 'EXHAUSTIVE_MAX_COMPOSITIONS', 0):
+                    meet_in_the_middle_result = meet_in_the_middle.find_best_composition(space, options, 1)
+
+                self.assertSameResult(branch_and_bound.find_best_composition(space, options, 1), expected)
+
+                # Below 51% winrate, the exhaustive solvers return the first composition and not the best one
+                if expected and expected[1] < 0.01:
+                    self.assertLessEqual(meet_in_the_middle_result[1], expected[1])
+                else:
+                    self.assertSameResult(meet_in_the_middle_result, expected)